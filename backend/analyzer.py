@@ -1,19 +1,36 @@
+import os
 import ast
-from typing import List, Optional
-import networkx as nx
+from typing import Dict, List, Optional
+from graph import CodeGraph
 from schemas import ArchitectureMetric
+from parsed_module import ParsedModule
+
+# "native" renders DOT directly; "networkx" renders through networkx/pydot as before
+ARCH_GRAPH_BACKEND = os.getenv("ARCH_GRAPH_BACKEND", "native")
 
 def _node_id(prefix: str, name: str) -> str:
     return f"{prefix}_{name.replace('.', '_').replace(' ', '_')}"
 
-def analyze_code(code: str, filename: Optional[str] = None) -> List[ArchitectureMetric]:
-    try:
-        tree = ast.parse(code)
-    except Exception as e:
-        dot = f'strict digraph "" {{\n\t// parse error: {str(e)}\n}}\n'
+def get_call_name(node: ast.Call) -> Optional[str]:
+    """`f`, `obj.method`, or the attribute name for deeper receivers; None for other callees."""
+    func = node.func
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute):
+        base = func.value
+        if isinstance(base, ast.Name):
+            return f"{base.id}.{func.attr}"
+        return func.attr
+    return None
+
+def analyze_code(code: str, filename: Optional[str] = None,
+                 module: Optional[ParsedModule] = None) -> List[ArchitectureMetric]:
+    module = module or ParsedModule(code, filename)
+    if not module.ok:
+        dot = f'strict digraph "" {{\n\t// parse error: {str(module.error)}\n}}\n'
         return [ArchitectureMetric(name=filename or "code", dot_diagram=dot)]
 
-    G = nx.DiGraph()
+    G = CodeGraph()
 
     module_node = "<module>"
     G.add_node(module_node, type="module", label=module_node)
@@ -21,7 +38,7 @@ def analyze_code(code: str, filename: Optional[str] = None) -> List[Architecture
     imports = {}
     variables = set()
 
-    for node in ast.walk(tree):
+    for node in module.nodes(ast.Import, ast.ImportFrom):
         if isinstance(node, ast.Import):
             for alias in node.names:
                 modname = alias.asname or alias.name
@@ -39,7 +56,7 @@ def analyze_code(code: str, filename: Optional[str] = None) -> List[Architecture
                 G.add_edge(module_node, nid, relation="imports")
                 imports[name] = nid
 
-    for node in tree.body:  # top-level statements only
+    for node in module.body:  # top-level statements only
         if isinstance(node, ast.Assign):
             for target in node.targets:
                 if isinstance(target, ast.Name):
@@ -67,42 +84,29 @@ def analyze_code(code: str, filename: Optional[str] = None) -> List[Architecture
             G.add_node(nid, type="class", label=cname)
             G.add_edge(module_node, nid, relation="defines_class")
 
-    for node in ast.walk(tree):
-        if isinstance(node, ast.Call):
-            func = node.func
-            call_name = None
-            if isinstance(func, ast.Name):
-                call_name = func.id
-            elif isinstance(func, ast.Attribute):
-                base = func.value
-                if isinstance(base, ast.Name):
-                    call_name = f"{base.id}.{func.attr}"
-                else:
-                    call_name = func.attr
+    linked: Dict[str, None] = {}  # call names already linked to their imports
+    for node in module.nodes(ast.Call):
+        call_name = get_call_name(node)
+        if call_name and call_name not in linked:
+            linked[call_name] = None
+            call_nid = _node_id("call", call_name)
+            G.add_node(call_nid, type="call", label=call_name)
+            G.add_edge(module_node, call_nid, relation="calls")
 
-            if call_name:
-                call_nid = _node_id("call", call_name)
-                G.add_node(call_nid, type="call", label=call_name)
-                parent = getattr(node, "parent", None)
-                G.add_edge(module_node, call_nid, relation="calls")
+            # an import matches the call name itself or any dotted prefix of it
+            parts = call_name.split(".")
+            for i in range(1, len(parts) + 1):
+                imp_nid = imports.get(".".join(parts[:i]))
+                if imp_nid:
+                    G.add_edge(call_nid, imp_nid, relation="calls_import")
 
-                for imp_name, imp_nid in imports.items():
-                    if call_name == imp_name or call_name.startswith(imp_name + "."):
-                        G.add_edge(call_nid, imp_nid, relation="calls_import")
-    try:
-        dot = nx.nx_pydot.to_pydot(G).to_string()
-    except Exception:
-        lines = ["strict digraph \"\" {"]
-        for n, d in G.nodes(data=True):
-            label = d.get("label", n)
-            lines.append(f'\t"{n}" [label="{label}"];')
-        for u, v, d in G.edges(data=True):
-            rel = d.get("relation", "")
-            if rel:
-                lines.append(f'\t"{u}" -> "{v}" [label="{rel}"];')
-            else:
-                lines.append(f'\t"{u}" -> "{v}";')
-        lines.append("}")
-        dot = "\n".join(lines)
+    return [ArchitectureMetric(name=filename or "code", dot_diagram=render_dot(G), graph=G.to_json())]
 
-    return [ArchitectureMetric(name=filename or "code", dot_diagram=dot)]
\ No newline at end of file
+def render_dot(G: CodeGraph) -> str:
+    if ARCH_GRAPH_BACKEND == "networkx":
+        try:
+            import networkx as nx
+            return nx.nx_pydot.to_pydot(G.to_networkx()).to_string()
+        except Exception:
+            pass
+    return G.to_dot()
@@ -0,0 +1,77 @@
+"""Architecture graph of large synthetic modules: CodeGraph + direct DOT against networkx + pydot.
+
+Usage (from backend/):
+    python -m benchmarks.bench_analyzer_graph --imports 200 --calls 5000
+"""
+import ast
+import time
+import random
+import argparse
+import networkx as nx
+from analyzer import analyze_code, _node_id
+from parsed_module import ParsedModule
+
+def legacy_analyze(module: ParsedModule) -> str:
+    """The networkx version: import links by scanning every import for every call, DOT through pydot."""
+    G = nx.DiGraph()
+    G.add_node("<module>", type="module", label="<module>")
+    imports = {}
+    for node in module.nodes(ast.Import, ast.ImportFrom):
+        for alias in node.names:
+            name = alias.asname or alias.name
+            nid = _node_id("import", name)
+            G.add_node(nid, type="import", label=f"import {name}")
+            G.add_edge("<module>", nid, relation="imports")
+            imports[name] = nid
+    for node in module.nodes(ast.Call):
+        func = node.func
+        if isinstance(func, ast.Name):
+            call_name = func.id
+        elif isinstance(func, ast.Attribute):
+            call_name = f"{func.value.id}.{func.attr}" if isinstance(func.value, ast.Name) else func.attr
+        else:
+            continue
+        call_nid = _node_id("call", call_name)
+        G.add_node(call_nid, type="call", label=call_name)
+        G.add_edge("<module>", call_nid, relation="calls")
+        for imp_name, imp_nid in imports.items():
+            if call_name == imp_name or call_name.startswith(imp_name + "."):
+                G.add_edge(call_nid, imp_nid, relation="calls_import")
+    return nx.nx_pydot.to_pydot(G).to_string()
+
+def synthetic_module(n_imports: int, n_calls: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    names = [f"pkg{i}" for i in range(n_imports)]
+    lines = [f"import {name}" for name in names]
+    lines.append("def main():")
+    for i in range(n_calls):
+        name = rng.choice(names)
+        lines.append(f"    {name}.func{rng.randrange(n_calls // 10 + 1)}(helper{i % 50}(x))")
+    return "\n".join(lines) + "\n"
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--imports", type=int, default=200)
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    code = synthetic_module(args.imports, args.calls)
+    module = ParsedModule(code)  # parsing is shared by both and not measured
+    legacy = best_of(lambda: legacy_analyze(module), args.repeat)
+    current = best_of(lambda: analyze_code(code, module=module), args.repeat)
+
+    print(f"{args.imports} imports, {args.calls} calls")
+    print(f"networkx + pydot: {legacy * 1000:8.1f} ms")
+    print(f"CodeGraph + DOT : {current * 1000:8.1f} ms  ({legacy / current:.1f}x)")
+
+if __name__ == "__main__":
+    main()
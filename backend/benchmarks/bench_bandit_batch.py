@@ -0,0 +1,53 @@
+"""Bandit over many files: a temp file and a fresh manager per file against batched bandit_scan.
+
+Usage (from backend/):
+    python -m benchmarks.bench_bandit_batch --files 200 --batch 1 8 32
+"""
+import time
+import logging
+import argparse
+import tempfile
+from typing import List
+from bandit.core import manager, config, constants
+from security import bandit_scan
+from benchmarks.bench_analyzer_graph import synthetic_module
+
+def legacy_scan(code: str) -> int:
+    """The former scan_code bandit step (temp file removed here so the benchmark does not leak)."""
+    with tempfile.NamedTemporaryFile(mode='w+', suffix='.py') as tmp:
+        tmp.write(code)
+        tmp.flush()
+        mgr = manager.BanditManager(config.BanditConfig(), 'file', verbose=False)
+        mgr.discover_files([tmp.name])
+        mgr.run_tests()
+        return len(mgr.get_issue_list(sev_level=constants.LOW, conf_level=constants.LOW))
+
+def synthetic_files(n: int) -> List[str]:
+    risky = "import subprocess\nsubprocess.call('ls ' + user, shell=True)\npassword = 'hunter2'\n"
+    return [risky + synthetic_module(20, 200, seed=i) for i in range(n)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+    logging.getLogger("bandit").setLevel(logging.ERROR)
+
+    files = synthetic_files(args.files)
+    start = time.perf_counter()
+    legacy_issues = sum(legacy_scan(code) for code in files)
+    legacy = time.perf_counter() - start
+    print(f"{args.files} files")
+    print(f"per-file manager + temp file: {legacy / args.files * 1000:7.2f} ms/file  ({legacy_issues} issues)")
+
+    for size in args.batch:
+        start = time.perf_counter()
+        issues = 0
+        for i in range(0, len(files), size):
+            issues += sum(len(found) for found in bandit_scan(files[i:i + size]))
+        elapsed = time.perf_counter() - start
+        print(f"bandit_scan, batches of {size:<4}: {elapsed / args.files * 1000:7.2f} ms/file  "
+              f"({issues} issues, {legacy / elapsed:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Write throughput of ReviewDB against the original single-connection layer.
+
+Usage (from backend/):
+    python -m benchmarks.bench_db_writes --rows 5000 --threads 4
+"""
+import os
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+from concurrent.futures import wait
+from db import ReviewDB
+
+class LegacyReviewDB:
+    """The pre-WAL layer: one shared connection, rollback journal, commit per insert."""
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()  # sqlite3 connections are not safe for concurrent use
+        self.conn.execute("CREATE TABLE IF NOT EXISTS reviews (repo TEXT, filepath TEXT, review_text TEXT)")
+        self.conn.commit()
+
+    def insert_review(self, repo, filepath, review_text):
+        with self.lock:
+            self.conn.execute("INSERT INTO reviews (repo, filepath, review_text) VALUES (?,?,?)",
+                              (repo, filepath, review_text))
+            self.conn.commit()
+
+def run(db, rows: int, threads: int) -> float:
+    text = "Consider splitting this function; it handles parsing and I/O. " * 8
+    per_thread = rows // threads
+    futures = []
+
+    def work(t):
+        for i in range(per_thread):
+            f = db.insert_review(f"repo{t % 3}", f"pkg/mod_{t}_{i}.py", text)
+            if f is not None:
+                futures.append(f)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=work, args=(t,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    wait(futures)
+    return per_thread * threads / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = run(LegacyReviewDB(os.path.join(tmp, "legacy.db")), args.rows, args.threads)
+        current = run(ReviewDB(os.path.join(tmp, "current.db")), args.rows, args.threads)
+
+    print(f"legacy : {legacy:10.0f} rows/s")
+    print(f"current: {current:10.0f} rows/s  ({current / legacy:.1f}x)")
+
+if __name__ == "__main__":
+    main()
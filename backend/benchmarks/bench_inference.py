@@ -0,0 +1,95 @@
+"""Tokens/sec and output agreement of the CPU inference modes against fp32.
+
+Each mode generates greedy feedback for the same review prompts. Agreement is
+the share of generated tokens matching the fp32 output up to the first
+divergence, and the text similarity of the two decoded outputs.
+
+Usage (from backend/):
+    python -m benchmarks.bench_inference --modes fp32,int8,bf16 --threads 8
+    python -m benchmarks.bench_inference --modes int8 --compile --min-similarity 0.8
+"""
+import sys
+import time
+import glob
+import difflib
+import argparse
+import torch
+from transformers import AutoTokenizer
+from review_engines.base import PROMPT_HEADER, PROMPT_REVIEW, HUGGINGFACE_TOKEN
+from review_engines.inference import INFERENCE_MODES, configure_threads, load_causal_lm
+from review_engines.python_engine import DEFAULT_MODEL
+
+def load_prompts(limit: int):
+    prompts = []
+    for path in sorted(glob.glob("test_scripts/*.py"))[:limit]:
+        with open(path, encoding="utf-8") as fh:
+            code = fh.read()[:2000]
+        prompts.append(PROMPT_HEADER.format(language="Python") + PROMPT_REVIEW.format(code=code))
+    return prompts
+
+def generate(tokenizer, model, prompts, max_new_tokens):
+    """Returns (generated token ids per prompt, seconds spent generating)."""
+    outputs, elapsed = [], 0.0
+    for prompt in prompts:
+        inputs = tokenizer(prompt, return_tensors="pt")
+        start = time.perf_counter()
+        with torch.no_grad():
+            out = model.generate(
+                **inputs, max_new_tokens=max_new_tokens, do_sample=False, pad_token_id=tokenizer.pad_token_id
+            )
+        elapsed += time.perf_counter() - start
+        outputs.append(out[0, inputs["input_ids"].shape[1]:].tolist())
+    return outputs, elapsed
+
+def agreement(reference, candidate):
+    matched = 0
+    for a, b in zip(reference, candidate):
+        if a != b:
+            break
+        matched += 1
+    return matched / max(len(reference), 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--modes", default="fp32,int8,bf16", help=f"comma separated, from {', '.join(INFERENCE_MODES)}")
+    parser.add_argument("--compile", action="store_true", help="also torch.compile the torch modes")
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads (0: torch default)")
+    parser.add_argument("--prompts", type=int, default=4)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--min-similarity", type=float, default=0.0,
+                        help="exit non-zero if a mode's mean text similarity to fp32 is below this")
+    args = parser.parse_args()
+
+    configure_threads(args.threads)
+    tokenizer = AutoTokenizer.from_pretrained(args.model, trust_remote_code=True, token=HUGGINGFACE_TOKEN)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    prompts = load_prompts(args.prompts)
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+
+    reference, _ = generate(tokenizer, load_causal_lm(args.model, -1, mode="fp32", compile=False)[0],
+                            prompts, args.max_new_tokens)
+    reference_text = [tokenizer.decode(ids, skip_special_tokens=True) for ids in reference]
+
+    failed = False
+    print(f"{'mode':<16}{'tokens/s':>10}{'token agree':>13}{'similarity':>12}")
+    for mode in modes:
+        model, effective = load_causal_lm(args.model, -1, mode=mode, compile=args.compile and mode != "onnx")
+        if args.compile:
+            generate(tokenizer, model, prompts[:1], 4)  # compilation happens on the first calls
+        outputs, elapsed = generate(tokenizer, model, prompts, args.max_new_tokens)
+        tokens = sum(len(ids) for ids in outputs)
+        agree = sum(agreement(r, o) for r, o in zip(reference, outputs)) / len(outputs)
+        similarity = sum(
+            difflib.SequenceMatcher(None, ref, tokenizer.decode(ids, skip_special_tokens=True)).ratio()
+            for ref, ids in zip(reference_text, outputs)
+        ) / len(outputs)
+        failed |= similarity < args.min_similarity
+        print(f"{effective:<16}{tokens / elapsed:>10.1f}{agree:>13.2f}{similarity:>12.2f}")
+        del model
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
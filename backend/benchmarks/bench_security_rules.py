@@ -0,0 +1,77 @@
+"""Security rule cost as rules are added: type-dispatched RuleEngine against checking every rule on every node.
+
+Synthetic rules target node types that are rare in the scanned module, as
+most real rules do, so the dispatched cost per node should stay flat.
+
+Usage (from backend/):
+    python -m benchmarks.bench_security_rules --calls 5000 --rules 0 16 64 256
+"""
+import ast
+import time
+import random
+import argparse
+from typing import List
+from parsed_module import ParsedModule
+from security_rules import RULES, Rule, RuleEngine, ScanContext
+
+RARE_TYPES = (ast.Lambda, ast.With, ast.Try, ast.Raise, ast.Assert, ast.Global, ast.Yield, ast.Await, ast.Delete)
+
+def synthetic_rules(n: int) -> List[Rule]:
+    def check(node, ctx):
+        return ()
+    return [Rule(f"synthetic-{i}", "synthetic", (RARE_TYPES[i % len(RARE_TYPES)],), check) for i in range(n)]
+
+def scan_every_node(module: ParsedModule, rules: List[Rule]) -> list:
+    """One isinstance test per rule per node, like the former if-chain over a full walk."""
+    ctx = ScanContext(module)
+    findings = []
+    for nodes in module.nodes_by_type.values():
+        for node in nodes:
+            for r in rules:
+                if isinstance(node, r.node_types):
+                    findings.extend(r.check(node, ctx))
+    return findings
+
+def synthetic_module(n_calls: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    lines = ["import os, subprocess, requests", "def main(x):"]
+    for i in range(n_calls):
+        choice = rng.randrange(4)
+        if choice == 0:
+            lines.append(f"    value{i} = helper{i % 50}(x, key='v{i}')")
+        elif choice == 1:
+            lines.append(f"    requests.get('https://host/{i}', data={{'k': x}})")
+        elif choice == 2:
+            lines.append(f"    subprocess.run(['echo', str({i})], shell=False)")
+        else:
+            lines.append(f"    os.path.join(x, 'part{i}')")
+    return "\n".join(lines) + "\n"
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--rules", type=int, nargs="+", default=[0, 16, 64, 256], help="extra synthetic rules")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    module = ParsedModule(synthetic_module(args.calls))  # parsing is shared and not measured
+    n_nodes = sum(len(nodes) for nodes in module.nodes_by_type.values())
+    print(f"{n_nodes} AST nodes, {len(RULES)} built-in rules")
+    print(f"{'rules':>6} {'every node ns/node':>20} {'dispatched ns/node':>20}")
+    for extra in args.rules:
+        rules = list(RULES.values()) + synthetic_rules(extra)
+        engine = RuleEngine(rules)
+        chained = best_of(lambda: scan_every_node(module, rules), args.repeat)
+        dispatched = best_of(lambda: engine.run(module), args.repeat)
+        print(f"{len(rules):>6} {chained / n_nodes * 1e9:>20.1f} {dispatched / n_nodes * 1e9:>20.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Per-process memory of N processes holding the LLM, with copied vs memory-mapped weights.
+
+Each process loads the model, runs one short generation so the weights are
+resident, and reports its RSS and PSS (from /proc/self/smaps_rollup, Linux)
+while all N processes are alive. PSS splits shared pages between the processes
+mapping them, so the PSS total is what the host actually pays.
+
+Usage (from backend/):
+    python -m benchmarks.bench_shared_memory --processes 4 --weights load,mmap
+"""
+import argparse
+import multiprocessing as mp
+from review_engines.python_engine import DEFAULT_MODEL
+
+def read_memory():
+    """(rss, pss) of the calling process in MiB."""
+    values = {}
+    with open("/proc/self/smaps_rollup") as fh:
+        for line in fh:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1]] = int(parts[1]) / 1024
+    return values["Rss"], values["Pss"]
+
+def hold_model(model_name, mode, weights, loaded, measured, results):
+    import torch
+    from transformers import AutoTokenizer
+    from review_engines.inference import load_causal_lm
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
+    model, _ = load_causal_lm(model_name, -1, mode=mode, compile=False, weights=weights)
+    with torch.no_grad():
+        model.generate(**tokenizer("def add(a, b):", return_tensors="pt"), max_new_tokens=4, do_sample=False)
+    loaded.wait()  # measure only once every process holds its model
+    results.put(read_memory())
+    measured.wait()
+
+def run(model_name, mode, weights, processes):
+    ctx = mp.get_context("spawn")
+    loaded, measured = ctx.Barrier(processes), ctx.Barrier(processes)
+    results = ctx.Queue()
+    workers = [
+        ctx.Process(target=hold_model, args=(model_name, mode, weights, loaded, measured, results))
+        for _ in range(processes)
+    ]
+    for w in workers:
+        w.start()
+    samples = [results.get() for _ in workers]
+    for w in workers:
+        w.join()
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--mode", default="fp32", choices=("fp32", "bf16"))
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--weights", default="load,mmap", help="comma separated: load, mmap")
+    args = parser.parse_args()
+
+    print(f"{'weights':<8}{'rss/proc MiB':>14}{'pss/proc MiB':>14}{'pss total MiB':>15}")
+    for weights in [w.strip() for w in args.weights.split(",") if w.strip()]:
+        samples = run(args.model, args.mode, weights, args.processes)
+        rss = sum(s[0] for s in samples) / len(samples)
+        pss = sum(s[1] for s in samples)
+        print(f"{weights:<8}{rss:>14.0f}{pss / len(samples):>14.0f}{pss:>15.0f}")
+
+if __name__ == "__main__":
+    main()
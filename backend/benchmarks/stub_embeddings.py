@@ -0,0 +1,45 @@
+"""Deterministic few-shot retrieval without the sentence-transformer model.
+
+HashEmbedder replaces the model behind PersonalizationStore with a hashed bag
+of words, so the index search and row fetches run as in production.
+"""
+import re
+import hashlib
+import numpy as np
+from typing import List
+from model_registry import ModelRegistry
+from personalization import PersonalizationStore
+
+WORD = re.compile(r"\w+|[^\w\s]")
+
+class HashEmbedder:
+    """Implements the parts of the SentenceTransformer API PersonalizationStore uses."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts: List[str], normalize_embeddings: bool = True, show_progress_bar: bool = False) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in WORD.findall(text):
+                out[row, int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), "little") % self.dim] += 1
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out
+
+def stub_personalization_store(db_path: str, examples: int = 0, seed: int = 0) -> PersonalizationStore:
+    """A store on its own registry with HashEmbedder, holding `examples` synthetic examples."""
+    store = PersonalizationStore(db_path)
+    store.models = ModelRegistry(idle_seconds=0)
+    store.models.register(store.model_key, HashEmbedder)
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(examples):
+        calls = " ".join(f"helper{n}(x)" for n in rng.integers(0, 200, size=6))
+        rows.append((f"def example{i}(x):\n    return {calls}\n", f"Example feedback {i}: split example{i} into smaller helpers."))
+    with store.conn:
+        store.conn.executemany("INSERT INTO examples (code, feedback) VALUES (?,?)", rows)
+    return store
@@ -0,0 +1,48 @@
+"""Deterministic review engine for benchmarks, so no model is downloaded.
+
+StubReviewEngine runs the real review path (static analysis, chunking, prompt
+building, few-shot retrieval and the batch scheduler) and only replaces the
+tokenizer and generate calls.
+"""
+import time
+import hashlib
+from typing import Callable, List
+from personalization import PersonalizationStore
+from review_engines.python_engine import PythonReviewEngine
+from benchmarks.stub_embeddings import WORD
+
+class StubReviewEngine(PythonReviewEngine):
+    """PythonReviewEngine whose feedback is a hash of the prompt.
+
+    `token_ms` simulates decode time per generated token; a batch costs the
+    time of its longest member, as with real batched generation.
+    """
+
+    def __init__(self, personal: PersonalizationStore, token_ms: float = 0.0, feedback_tokens: int = 32):
+        super().__init__(model_name="stub", use_gpu=False)
+        self.personal = personal
+        self.token_ms = token_ms
+        self.feedback_tokens = feedback_tokens
+
+    def count_tokens(self, text: str) -> int:
+        return len(WORD.findall(text))
+
+    def _feedback(self, prompt, max_new_tokens: int) -> List[str]:
+        text = "".join(prompt) if isinstance(prompt, tuple) else prompt
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        n = min(max_new_tokens, self.feedback_tokens)
+        return [f"note{digest[i % 60:i % 60 + 4]}" for i in range(n)]
+
+    def _generate_batch(self, prompts, max_new_tokens: int) -> List[str]:
+        words = [self._feedback(prompt, max_new_tokens) for prompt in prompts]
+        if self.token_ms:
+            time.sleep(self.token_ms * max(map(len, words)) / 1000.0)
+        return [" ".join(w) for w in words]
+
+    def _generate_streaming(self, prompt, max_new_tokens: int, on_token: Callable[[str], None]) -> str:
+        words = self._feedback(prompt, max_new_tokens)
+        for word in words:
+            if self.token_ms:
+                time.sleep(self.token_ms / 1000.0)
+            on_token(word + " ")
+        return " ".join(words)
@@ -0,0 +1,373 @@
+"""Stage-level benchmark suite: each pipeline stage on its own, and end to end through the API.
+
+Runs on synthetic repositories of several sizes with StubReviewEngine, so no
+model is downloaded. Each stage reports throughput, per-file latency
+percentiles and peak Python memory (tracemalloc, measured in a second pass so
+it does not slow the timed pass); the api stage reports per-job latency and
+the process's peak RSS. Results are saved as JSON, and `compare` flags
+regressions against a baseline (exit status 1).
+
+Stages: ingest (zip streaming), analyze (analyze_code), scan (scan_code with
+bandit), summarize (module summaries and the repo graph), retrieval
+(few-shot example search), db (durable review writes), review (the stub
+engine's full review) and api (upload, worker and status polling).
+
+Usage (from backend/):
+    python -m benchmarks.suite run --sizes 20 200 1000 --output baseline.json
+    python -m benchmarks.suite run --sizes 20 200 1000 --output current.json
+    python -m benchmarks.suite compare baseline.json current.json --threshold 0.15
+"""
+import gc
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import resource
+import threading
+import subprocess
+import tracemalloc
+from functools import partial
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from analyzer import analyze_code
+from db import ReviewDB
+from prepare_files import iter_zip_files
+from repo_graph import RepoGraph, summarize_module
+from schemas import SecurityFinding
+from security import scan_code
+from benchmarks.stub_embeddings import stub_personalization_store
+from benchmarks.synthetic_repo import synthetic_repo, zip_repo
+
+# stage -> (per-item latencies in seconds, files processed)
+StageResult = Tuple[List[float], int]
+
+class Workload(NamedTuple):
+    size: int
+    seed: int
+    files: Dict[str, str]
+    zip_path: str
+    workdir: str
+
+    @property
+    def sources(self) -> List[Tuple[str, str]]:
+        return [(path, code) for path, code in self.files.items() if code]
+
+def timed(items, fn: Callable) -> List[float]:
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        fn(*item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def stage_ingest(w: Workload, args) -> StageResult:
+    latencies = []
+    files = iter_zip_files(w.zip_path)
+    while True:
+        start = time.perf_counter()
+        if next(files, None) is None:
+            break
+        latencies.append(time.perf_counter() - start)
+    return latencies, len(latencies)
+
+def stage_analyze(w: Workload, args) -> StageResult:
+    return timed(w.sources, lambda path, code: analyze_code(code, path)), len(w.sources)
+
+def stage_scan(w: Workload, args) -> StageResult:
+    return timed(w.sources, lambda path, code: scan_code(code, path)), len(w.sources)
+
+def stage_summarize(w: Workload, args) -> StageResult:
+    graph = RepoGraph()
+    latencies = timed(w.files.items(), lambda path, code: graph.add(path, summarize_module(code)))
+    graph.build()  # counted in the stage total, not per file
+    return latencies, len(w.files)
+
+_stores: Dict[str, object] = {}
+
+def retrieval_store(workdir: str, examples: int):
+    key = f"{workdir}:{examples}"
+    if key not in _stores:
+        store = stub_personalization_store(os.path.join(workdir, f"personal-{examples}.db"), examples=examples)
+        store.get_examples("warm up")  # embeds the examples and builds the index
+        _stores[key] = store
+    return _stores[key]
+
+def stage_retrieval(w: Workload, args) -> StageResult:
+    store = retrieval_store(w.workdir, args.examples)
+    return timed(w.sources, lambda path, code: store.get_examples(code, k=3)), len(w.sources)
+
+def stage_db(w: Workload, args) -> StageResult:
+    db = ReviewDB(os.path.join(w.workdir, f"reviews-{w.size}-{time.time_ns()}.db"))
+    findings = [SecurityFinding(issue="Use of eval()", severity="HIGH", line=3)]
+    text = "Consider splitting this function; it handles parsing and I/O. " * 8
+    # every write is submitted at once, as by concurrent files; latency is submit to commit
+    latencies = []
+    committed = threading.Semaphore(0)
+
+    def record(future, submitted):
+        future.result()
+        latencies.append(time.perf_counter() - submitted)
+        committed.release()
+
+    for path, _ in w.sources:
+        future = db.insert_review("bench", path, text, security_findings=findings)
+        future.add_done_callback(partial(record, submitted=time.perf_counter()))
+    for _ in w.sources:
+        committed.acquire()
+    return latencies, len(w.sources)
+
+_engines: Dict[str, object] = {}
+
+def stub_engine(workdir: str, examples: int, token_ms: float):
+    from benchmarks.stub_engine import StubReviewEngine
+    if "engine" not in _engines:
+        _engines["engine"] = StubReviewEngine(retrieval_store(workdir, examples), token_ms=token_ms)
+    return _engines["engine"]
+
+def stage_review(w: Workload, args) -> StageResult:
+    engine = stub_engine(w.workdir, args.examples, args.token_ms)
+    return timed(w.sources, lambda path, code: engine.review(code, path)), len(w.sources)
+
+class ApiHarness:
+    """The FastAPI app with the stub engine, its databases and uploads in a scratch directory."""
+
+    def __init__(self, workdir: str, examples: int, token_ms: float):
+        os.environ.setdefault("UPLOAD_DIR", os.path.join(workdir, "uploads"))
+        os.environ["JOB_EXECUTION"] = "embedded"
+        os.environ["MODEL_WARMUP"] = "0"
+        self.cwd = os.getcwd()
+        os.chdir(workdir)  # pipeline opens reviews.db and personal.db relative to the working directory
+        from fastapi.testclient import TestClient
+        import main
+        import pipeline
+        pipeline.engines["py"] = stub_engine(workdir, examples, token_ms)
+        self.client = TestClient(main.app)
+        self.client.__enter__()
+
+    def close(self):
+        self.client.__exit__(None, None, None)
+        os.chdir(self.cwd)
+
+    def review(self, zip_path: str, poll_seconds: float = 0.02) -> float:
+        start = time.perf_counter()
+        with open(zip_path, "rb") as fh:
+            response = self.client.post("/upload", files={"file": ("repo.zip", fh, "application/zip")})
+        response.raise_for_status()
+        job_id = response.json()["job_id"]
+        while True:
+            status = self.client.get(f"/status/{job_id}").json()
+            if status["status"] in ("completed", "failed"):
+                if status["status"] == "failed":
+                    raise RuntimeError(f"Job {job_id} failed: {status.get('error')}")
+                return time.perf_counter() - start
+            time.sleep(poll_seconds)
+
+_api: List[ApiHarness] = []
+
+def stage_api(w: Workload, args) -> StageResult:
+    if not _api:
+        _api.append(ApiHarness(w.workdir, args.examples, args.token_ms))
+    latencies = []
+    for job in range(args.api_jobs):
+        # a fresh repository per job, so neither the review nor the summary cache is hit
+        files = synthetic_repo(w.size, seed=w.seed + 1000 + job)
+        zip_path = os.path.join(w.workdir, f"api-{w.size}-{job}.zip")
+        zip_repo(files, zip_path)
+        latencies.append(_api[0].review(zip_path))
+    return latencies, args.api_jobs * len(w.sources)
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100.0 * len(sorted_values)))]
+
+def summarize(latencies: List[float], files: int, seconds: float, unit: str) -> dict:
+    values = sorted(latencies)
+    return {
+        "files": files,
+        "seconds": round(seconds, 6),
+        "files_per_s": round(files / seconds, 3) if seconds else None,
+        "latency_unit": unit,
+        "latency_ms": {
+            "p50": round(percentile(values, 50) * 1000, 4),
+            "p95": round(percentile(values, 95) * 1000, 4),
+            "p99": round(percentile(values, 99) * 1000, 4),
+            "max": round(values[-1] * 1000, 4) if values else 0.0,
+        },
+    }
+
+def measure(stage: Callable[[Workload, argparse.Namespace], StageResult], w: Workload, args,
+            memory: bool, unit: str = "file", repeat: int = 1) -> dict:
+    """Best of `repeat` timed passes, then an optional tracemalloc pass for peak memory."""
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        latencies, files = stage(w, args)
+        attempt = summarize(latencies, files, time.perf_counter() - start, unit)
+        if result is None or attempt["seconds"] < result["seconds"]:
+            result = attempt
+    if memory:
+        tracemalloc.start()
+        try:
+            stage(w, args)
+            result["peak_memory_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 3)
+        finally:
+            tracemalloc.stop()
+    return result
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args) -> dict:
+    stages = args.stages
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "sizes": args.sizes,
+            "stages": stages,
+            "examples": args.examples,
+            "token_ms": args.token_ms,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="codelens-bench-") as workdir:
+        try:
+            for size in args.sizes:
+                seed = args.seed + size
+                files = synthetic_repo(size, seed=seed)
+                zip_path = os.path.join(workdir, f"repo-{size}.zip")
+                zip_repo(files, zip_path)
+                w = Workload(size, seed, files, zip_path, workdir)
+                results = report["results"][str(size)] = {}
+                for name in stages:
+                    print(f"[{size} files] {name} ...", file=sys.stderr, flush=True)
+                    try:
+                        if name == "api":
+                            # jobs run in the worker and its pools, where tracemalloc cannot follow
+                            results[name] = measure(stage_api, w, args, memory=False, unit="job")
+                            results[name]["peak_rss_mb"] = round(
+                                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+                            )
+                        else:
+                            results[name] = measure(STAGES[name], w, args, args.memory, repeat=args.repeat)
+                    except ImportError as e:
+                        # the review and api stages need torch and transformers installed
+                        results[name] = {"skipped": str(e)}
+        finally:
+            while _api:
+                _api.pop().close()
+    return report
+
+STAGES: Dict[str, Callable[[Workload, argparse.Namespace], StageResult]] = {
+    "ingest": stage_ingest,
+    "analyze": stage_analyze,
+    "scan": stage_scan,
+    "summarize": stage_summarize,
+    "retrieval": stage_retrieval,
+    "db": stage_db,
+    "review": stage_review,
+    "api": stage_api,
+}
+
+def print_report(report: dict):
+    print(f"{'size':>6} {'stage':<10} {'files/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'peak MB':>9}")
+    for size, stages in report["results"].items():
+        for name, r in stages.items():
+            if "skipped" in r:
+                print(f"{size:>6} {name:<10} skipped: {r['skipped']}")
+                continue
+            lat = r["latency_ms"]
+            peak = r.get("peak_memory_mb", r.get("peak_rss_mb"))
+            print(f"{size:>6} {name:<10} {r['files_per_s']:>10.1f} {lat['p50']:>10.3f} {lat['p95']:>10.3f} "
+                  f"{lat['p99']:>10.3f} {'' if peak is None else f'{peak:.1f}':>9}")
+
+def compare(baseline: dict, current: dict, threshold: float, min_ms: float, min_seconds: float) -> List[str]:
+    """Regressions of `current` against `baseline`: lower throughput, higher p95 latency or peak memory.
+
+    Throughput of stages that took under `min_seconds` in the baseline is shown but not judged,
+    as timer noise dominates there.
+    """
+    regressions = []
+    print(f"{'size':>6} {'stage':<10} {'metric':<15} {'baseline':>12}    {'current':>12} {'change':>8}")
+    for size, stages in current["results"].items():
+        for name, cur in stages.items():
+            old = baseline["results"].get(size, {}).get(name)
+            if not old or "skipped" in old or "skipped" in cur:
+                continue
+            checks = [
+                ("files/s", old["files_per_s"], cur["files_per_s"], True, old["seconds"] >= min_seconds),
+                ("p95 ms", old["latency_ms"]["p95"], cur["latency_ms"]["p95"], False,
+                 cur["latency_ms"]["p95"] - old["latency_ms"]["p95"] > min_ms),
+            ]
+            for key in ("peak_memory_mb", "peak_rss_mb"):
+                if key in old and key in cur:
+                    checks.append((key, old[key], cur[key], False, cur[key] - old[key] > 1.0))
+            for metric, before, after, higher_is_better, significant in checks:
+                if not before or after is None:
+                    continue
+                change = (after - before) / before
+                worse = significant and (change < -threshold if higher_is_better else change > threshold)
+                flag = "REGRESSION" if worse else ""
+                print(f"{size:>6} {name:<10} {metric:<15} {before:>12.3f} -> {after:>12.3f} {change:>+8.1%} {flag}")
+                if worse:
+                    regressions.append(f"{size} files, {name}: {metric} {before:.3f} -> {after:.3f} ({change:+.1%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the suite and save the results")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=[20, 200, 1000], help="files per synthetic repo")
+    run_parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    run_parser.add_argument("--examples", type=int, default=500, help="few-shot examples in the retrieval store")
+    run_parser.add_argument("--token-ms", type=float, default=0.0, help="simulated decode time per generated token")
+    run_parser.add_argument("--api-jobs", type=int, default=3, help="jobs per size through the API")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--repeat", type=int, default=3, help="timed passes per stage, the fastest is kept")
+    run_parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the tracemalloc pass")
+    run_parser.add_argument("--output", default="benchmark-results.json")
+
+    compare_parser = commands.add_parser("compare", help="flag regressions against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.15, help="relative change counted as a regression")
+    compare_parser.add_argument("--min-ms", type=float, default=0.05, help="ignore latency changes below this")
+    compare_parser.add_argument("--min-seconds", type=float, default=0.05,
+                                help="do not judge throughput of stages faster than this in the baseline")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run(args)
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print_report(report)
+        print(f"\nSaved {args.output}")
+        return
+
+    with open(args.baseline, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    with open(args.current, encoding="utf-8") as fh:
+        current = json.load(fh)
+    regressions = compare(baseline, current, args.threshold, args.min_ms, args.min_seconds)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\nNo regressions.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Deterministic synthetic Python repositories for benchmarks."""
+import random
+import zipfile
+from typing import Dict
+
+def synthetic_repo(n_files: int, seed: int = 0, functions_per_file: int = 8) -> Dict[str, str]:
+    """{relative path: source} for a package tree of `n_files` modules.
+
+    Modules import a few other modules at random (so there are import cycles),
+    define a class and functions, and contain some of the calls the security
+    rules look for, so every stage has realistic work.
+    """
+    rng = random.Random(seed)
+    n_packages = max(1, n_files // 25)
+    paths = [f"app/pkg{i % n_packages}/mod{i}.py" for i in range(n_files)]
+    names = [p[:-3].replace("/", ".") for p in paths]
+    files: Dict[str, str] = {f"app/pkg{p}/__init__.py": "" for p in range(n_packages)}
+    files["app/__init__.py"] = ""
+
+    for i, path in enumerate(paths):
+        lines = ["import os", "import json", "import subprocess"]
+        for j in sorted(rng.sample(range(n_files), min(n_files, 3))):
+            if j != i:
+                lines.append(f"from {names[j]} import func0 as dep{j}")
+        lines.append("")
+        lines.append(f"class Service{i}:")
+        lines.append("    def __init__(self, config):")
+        lines.append("        self.config = config")
+        lines.append("")
+        lines.append("    def handle(self, request):")
+        lines.append("        payload = json.loads(request)")
+        lines.append("        return {k: str(v) for k, v in payload.items()}")
+        for f in range(functions_per_file):
+            lines.append("")
+            lines.append(f"def func{f}(items, limit={rng.randrange(10, 100)}):")
+            lines.append("    total = 0")
+            lines.append("    for item in items[:limit]:")
+            lines.append("        if item % 3 == 0:")
+            lines.append("            total += item")
+            choice = rng.randrange(12)
+            if choice == 0:
+                lines.append("    subprocess.call('ls ' + str(total), shell=True)")
+            elif choice == 1:
+                lines.append("    api_token = 'token-0123456789'")
+            elif choice == 2:
+                lines.append("    os.system('echo ' + str(total))")
+            lines.append(f"    return os.path.join(str(total), 'out{f}')")
+        files[path] = "\n".join(lines) + "\n"
+    return files
+
+def zip_repo(files: Dict[str, str], zip_path: str):
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for path, code in files.items():
+            zf.writestr(path, code)
@@ -0,0 +1,232 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# seconds; covers sub-millisecond cache hits up to multi-minute repository reviews
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+Labels = Tuple[str, ...]
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Metric(ABC):
+    """A named metric family with fixed label names; values are kept per label tuple."""
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _label_text(self, values: Labels, extra: str = "") -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]:
+        """Sample lines of the exposition format."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, labels: Labels = ()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{self._label_text(labels)} {_format_value(value)}"
+
+class Gauge(Metric):
+    """A value that goes up and down; `read` makes it a callback evaluated at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 read: Optional[Callable[[], Dict[Labels, float]]] = None):
+        super().__init__(name, help, labels)
+        self._values: Dict[Labels, float] = {}
+        self.read = read
+
+    def set(self, value: float, labels: Labels = ()):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, amount: float = 1.0, labels: Labels = ()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, labels: Labels = ()):
+        self.inc(-amount, labels)
+
+    def samples(self) -> Iterator[str]:
+        if self.read is not None:
+            items = list(self.read().items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{self._label_text(labels)} {_format_value(value)}"
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label tuple: [count per bucket (last is +Inf)], sum
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, labels: Labels = ()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = [(labels, list(counts), total[0]) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket{self._label_text(labels, le)} {cumulative}"
+            yield f"{self.name}_sum{self._label_text(labels)} {_format_value(total)}"
+            yield f"{self.name}_count{self._label_text(labels)} {cumulative}"
+
+REGISTRY: List[Metric] = []
+
+def render_metrics() -> str:
+    """Every registered metric in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+# --- Stage timing ---
+
+STAGE_SECONDS = Histogram("codelens_stage_seconds", "Time spent per pipeline stage", labels=("stage",))
+
+class JobTimings:
+    """Seconds per stage for one job, summed over its files.
+
+    Files are reviewed concurrently, so the stages can add up to more than the
+    job's wall time (recorded as the `job` stage).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seconds: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {stage: round(seconds, 4) for stage, seconds in self._seconds.items()}
+
+class SharedTimings:
+    """Stands in for the timings of several jobs whose work is done together, e.g. one batched generate call.
+
+    Each job is charged the full time of the shared stage, once per stage however many of its items took part.
+    """
+
+    def __init__(self, timings: Iterable[Optional[JobTimings]]):
+        self.timings = list({id(t): t for t in timings if t is not None}.values())
+
+    def add(self, stage: str, seconds: float):
+        for timings in self.timings:
+            timings.add(stage, seconds)
+
+# timings of the job being processed; executor_task carries it into worker threads
+current_job_timings: ContextVar[Optional[JobTimings]] = ContextVar("current_job_timings", default=None)
+
+def record_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, (stage,))
+    timings = current_job_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Time the block (or decorated function) as `stage`, globally and for the current job."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+# --- Executor occupancy ---
+
+EXECUTOR_THREADS = Gauge("codelens_executor_threads", "Threads of each executor", labels=("executor",))
+EXECUTOR_BUSY = Gauge("codelens_executor_busy", "Tasks currently running on each executor", labels=("executor",))
+EXECUTOR_WAIT_SECONDS = Histogram(
+    "codelens_executor_wait_seconds", "Time tasks waited for a free executor thread", labels=("executor",)
+)
+
+def executor_task(executor: str, fn: Callable, *args, **kwargs) -> Callable[[], object]:
+    """`fn(*args, **kwargs)` for run_in_executor, counted towards the executor's occupancy.
+
+    It runs in a copy of the caller's context, so stage timings reach the job.
+    """
+    context = copy_context()
+    submitted = time.perf_counter()
+    labels = (executor,)
+
+    def run():
+        EXECUTOR_WAIT_SECONDS.observe(time.perf_counter() - submitted, labels)
+        EXECUTOR_BUSY.inc(labels=labels)
+        try:
+            return context.run(fn, *args, **kwargs)
+        finally:
+            EXECUTOR_BUSY.dec(labels=labels)
+    return run
+
+# --- Exposition for processes without the API (standalone workers) ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics on a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
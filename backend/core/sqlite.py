@@ -0,0 +1,145 @@
+import os
+import queue
+import atexit
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+from core.logging_config import logger
+from core.metrics import Counter, Histogram
+
+WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "256"))
+WRITE_BATCH_DELAY_MS = float(os.getenv("DB_WRITE_BATCH_DELAY_MS", "20"))
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",   # WAL + NORMAL: durable across app crashes, fsync only at checkpoints
+    "PRAGMA cache_size=-16000",    # 16 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+DB_WRITES = Counter("codelens_db_writes_total", "Writes committed by the batch writer", labels=("db",))
+DB_WRITE_BATCH_SIZE = Histogram(
+    "codelens_db_write_batch_size", "Writes per batch transaction", labels=("db",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+)
+DB_WRITE_WAIT_SECONDS = Histogram("codelens_db_write_wait_seconds", "Time writes waited in the queue", labels=("db",))
+DB_COMMIT_SECONDS = Histogram("codelens_db_commit_seconds", "Duration of each batch transaction", labels=("db",))
+
+def connect(db_path: str, autocommit: bool = False) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None if autocommit else "")
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+class ThreadLocalConnections:
+    """One connection per thread, so readers never share a connection (or its lock)."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.db_path)
+            self._local.conn = conn
+        return conn
+
+class BatchWriter:
+    """Runs all writes for one database file on a single thread, many per transaction.
+
+    `submit` queues a callable taking the write connection and returns a Future
+    with its result. The writer drains up to WRITE_BATCH_SIZE queued callables
+    (waiting at most WRITE_BATCH_DELAY_MS for more) and commits them together.
+    Each callable runs inside its own savepoint, so one failing write does not
+    roll back the rest of the batch.
+    """
+
+    def __init__(self, db_path: str, max_batch: int = WRITE_BATCH_SIZE, max_delay_ms: float = WRITE_BATCH_DELAY_MS):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000.0
+        self.conn = connect(db_path, autocommit=True)
+        self._labels = (os.path.basename(db_path),)
+        # (write, its future, perf_counter at submit)
+        self._queue: "queue.Queue[Tuple[Callable[[sqlite3.Connection], Any], Future, float]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"sqlite-writer:{db_path}", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        future: Future = Future()
+        self._queue.put((fn, future, time.perf_counter()))
+        return future
+
+    def execute(self, sql: str, params: tuple = ()) -> Future:
+        return self.submit(lambda conn: conn.execute(sql, params).rowcount)
+
+    def flush(self, timeout: float = None):
+        """Block until everything submitted so far is committed."""
+        self.submit(lambda conn: None).result(timeout=timeout)
+
+    def _collect(self) -> List[Tuple[Callable, Future, float]]:
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get(timeout=self.max_delay))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            results = []
+            start = time.perf_counter()
+            for _, _, submitted in batch:
+                DB_WRITE_WAIT_SECONDS.observe(start - submitted, self._labels)
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+                for fn, future, _ in batch:
+                    self.conn.execute("SAVEPOINT item")
+                    try:
+                        results.append((future, fn(self.conn), None))
+                        self.conn.execute("RELEASE item")
+                    except Exception as e:
+                        self.conn.execute("ROLLBACK TO item")
+                        self.conn.execute("RELEASE item")
+                        results.append((future, None, e))
+                self.conn.execute("COMMIT")
+            except Exception as e:
+                logger.exception(f"SQLite write batch failed for {self.db_path}: {e}")
+                if self.conn.in_transaction:
+                    self.conn.execute("ROLLBACK")
+                results = [(future, None, e) for _, future, _ in batch]
+            DB_COMMIT_SECONDS.observe(time.perf_counter() - start, self._labels)
+            DB_WRITE_BATCH_SIZE.observe(len(batch), self._labels)
+            DB_WRITES.inc(len(batch), self._labels)
+
+            for future, value, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(value)
+
+def log_write_errors(future: Future, description: str) -> Future:
+    """Log the failure of a write nobody waits for."""
+    def check(done: Future):
+        if not done.cancelled() and done.exception() is not None:
+            logger.error(f"Failed to {description}: {done.exception()}")
+    future.add_done_callback(check)
+    return future
+
+_writers: Dict[str, BatchWriter] = {}
+_writers_guard = threading.Lock()
+
+def get_writer(db_path: str) -> BatchWriter:
+    """Shared writer per database file: SQLite allows one writer at a time anyway."""
+    key = os.path.abspath(db_path)
+    with _writers_guard:
+        if key not in _writers:
+            _writers[key] = BatchWriter(db_path)
+        return _writers[key]
@@ -1,17 +1,92 @@
 import sqlite3
 import json
-from typing import Optional
-from schemas import FinalReview, Job, ReviewOutput
+import os
+import time
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+from schemas import FileReview, FinalReview, Job, RepoArchitecture, ReviewOutput, SecurityFinding
+from core.sqlite import ThreadLocalConnections, get_writer
+from core.metrics import timed
+
+REVIEW_CACHE_MAX_ENTRIES = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", "10000"))
+REVIEW_CACHE_MAX_BYTES = int(os.getenv("REVIEW_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# hit/miss counters and LRU access times are kept in memory and written at most this often
+REVIEW_CACHE_FLUSH_SECONDS = float(os.getenv("REVIEW_CACHE_FLUSH_SECONDS", "5"))
+REPO_SUMMARY_CHARS = 1000
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# columns added to the original jobs table: the durable queue, repo architecture, stage timings
+JOB_COLUMNS = (
+    ("payload", "TEXT"),
+    ("attempts", "INTEGER DEFAULT 0"),
+    ("max_attempts", f"INTEGER DEFAULT {JOB_MAX_ATTEMPTS}"),
+    ("lease_owner", "TEXT"),
+    ("lease_expires_at", "REAL"),
+    ("heartbeat_at", "REAL"),
+    ("created_at", "REAL"),
+    ("updated_at", "REAL"),
+    ("architecture", "TEXT"),
+    ("timings", "TEXT"),
+    ("lane", "TEXT"),
+)
+
+INSERT_JOB = (
+    "INSERT INTO jobs (job_id, status, code, filename, repo, result, error, payload, lane, attempts, "
+    "max_attempts, created_at, updated_at) VALUES (?,?,?,?,?,?,?,?,?,0,?,?,?)"
+)
+
+def job_row(job: FinalReview, code: Optional[str], filename: Optional[str], repo: Optional[str],
+            payload: Optional[dict] = None, lane: Optional[str] = None) -> tuple:
+    """Parameters of INSERT_JOB for a new job."""
+    now = time.time()
+    return (job.job_id, job.status, code, filename, repo, serialize_results(job.result), job.error,
+            json.dumps(payload) if payload is not None else None, lane, JOB_MAX_ATTEMPTS, now, now)
+
+def serialize_results(files: Optional[List[FileReview]]) -> Optional[str]:
+    """Job results as stored in jobs.result; source code is not stored again."""
+    if not files:
+        return None
+    return json.dumps([f.model_dump(exclude={"code"}) for f in files])
+
+def deserialize_results(raw: Optional[str]) -> Optional[List[FileReview]]:
+    if not raw:
+        return None
+    try:
+        data = json.loads(raw)
+        if isinstance(data, dict):
+            # rows written before per-file results were stored held a single ReviewOutput
+            return [FileReview(code="", review=ReviewOutput.model_validate(data))]
+        return [FileReview.model_validate({**item, "code": ""}) for item in data]
+    except Exception:
+        return None
 
 class ReviewDB:
+    """Reviews and jobs storage.
+
+    Reads use a connection per thread; writes go through the shared batching
+    writer for the database file and return a Future that resolves once the
+    write is committed.
+    """
+
     def __init__(self, db_path="reviews.db"):
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.conn.execute("""CREATE TABLE IF NOT EXISTS reviews (
+        self.db_path = db_path
+        self._connections = ThreadLocalConnections(db_path)
+        self.writer = get_writer(db_path)
+        self.fts_enabled = self.writer.submit(self._create_schema).result()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection) -> bool:
+        conn.execute("""CREATE TABLE IF NOT EXISTS reviews (
             repo TEXT,
             filepath TEXT,
             review_text TEXT
         )""")
-        self.conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+        conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
             job_id TEXT PRIMARY KEY,
             status TEXT,
             code TEXT,
@@ -20,57 +95,395 @@ class ReviewDB:
             result TEXT,
             error TEXT
         )""")
-        self.conn.commit()
+        conn.execute("""CREATE TABLE IF NOT EXISTS repo_snapshots (
+            git_url TEXT PRIMARY KEY,
+            commit_sha TEXT,
+            reviewed_at REAL
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS repo_snapshot_files (
+            git_url TEXT,
+            path TEXT,
+            blob_sha TEXT,
+            review TEXT,
+            review_config TEXT,
+            PRIMARY KEY (git_url, path)
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS repo_aggregates (
+            repo TEXT PRIMARY KEY,
+            file_count INTEGER DEFAULT 0,
+            review_count INTEGER DEFAULT 0,
+            high INTEGER DEFAULT 0,
+            medium INTEGER DEFAULT 0,
+            low INTEGER DEFAULT 0,
+            last_reviewed_at REAL,
+            rolling_summary TEXT DEFAULT ''
+        )""")
+        # severities of each file's latest review, so re-reviews replace rather than add to the aggregate
+        conn.execute("""CREATE TABLE IF NOT EXISTS review_file_severities (
+            repo TEXT,
+            filepath TEXT,
+            high INTEGER DEFAULT 0,
+            medium INTEGER DEFAULT 0,
+            low INTEGER DEFAULT 0,
+            PRIMARY KEY (repo, filepath)
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS module_summaries (
+            content_hash TEXT PRIMARY KEY,
+            summary TEXT
+        )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_repo_filepath ON reviews(repo, filepath)")
+        job_columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, decl in JOB_COLUMNS:
+            if column not in job_columns:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {decl}")
+        snapshot_columns = {row[1] for row in conn.execute("PRAGMA table_info(repo_snapshot_files)")}
+        if "review_config" not in snapshot_columns:
+            # rows stored before configs were recorded never match one, so their files are re-reviewed
+            conn.execute("ALTER TABLE repo_snapshot_files ADD COLUMN review_config TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at)")
+
+        has_reviews = conn.execute("SELECT 1 FROM reviews LIMIT 1").fetchone() is not None
+        if has_reviews and conn.execute("SELECT 1 FROM repo_aggregates LIMIT 1").fetchone() is None:
+            # reviews stored before aggregates existed; their severities are unknown
+            conn.execute("""INSERT INTO repo_aggregates (repo, file_count, review_count, rolling_summary)
+                SELECT repo, COUNT(DISTINCT filepath), COUNT(*), substr(group_concat(review_text, ' '), 1, ?)
+                FROM reviews GROUP BY repo""", (REPO_SUMMARY_CHARS,))
+
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='reviews_fts'"
+            ).fetchone()
+            conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS reviews_fts USING fts5(
+                review_text, content='reviews', content_rowid='rowid'
+            )""")
+            if not exists and has_reviews:
+                conn.execute("INSERT INTO reviews_fts(reviews_fts) VALUES ('rebuild')")
+            return True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: search_reviews falls back to LIKE
+            return False
 
-    def insert_review(self, repo: str, filepath: str, review_text: str):
-        self.conn.execute("INSERT INTO reviews (repo, filepath, review_text) VALUES (?,?,?)",
-                          (repo, filepath, review_text))
-        self.conn.commit()
+    def insert_review(self, repo: str, filepath: str, review_text: str,
+                      security_findings: Optional[List[SecurityFinding]] = None) -> Future:
+        """Store a review and fold it into the repo aggregate and search index in one transaction.
+
+        The aggregate's severity counts reflect the latest review of each file.
+        """
+        severities = {"high": 0, "medium": 0, "low": 0}
+        for finding in security_findings or []:
+            level = str(finding.severity).split(".")[-1].lower()
+            if level in severities:
+                severities[level] += 1
+        reviewed_at = time.time()
+        fts_enabled = self.fts_enabled
+
+        def write(conn: sqlite3.Connection):
+            seen = conn.execute(
+                "SELECT 1 FROM reviews WHERE repo=? AND filepath=? LIMIT 1", (repo, filepath)
+            ).fetchone()
+            rowid = conn.execute(
+                "INSERT INTO reviews (repo, filepath, review_text) VALUES (?,?,?)", (repo, filepath, review_text)
+            ).lastrowid
+            if fts_enabled:
+                conn.execute("INSERT INTO reviews_fts (rowid, review_text) VALUES (?,?)", (rowid, review_text))
+            previous = conn.execute(
+                "SELECT high, medium, low FROM review_file_severities WHERE repo=? AND filepath=?", (repo, filepath)
+            ).fetchone() or (0, 0, 0)
+            conn.execute(
+                "INSERT OR REPLACE INTO review_file_severities (repo, filepath, high, medium, low) VALUES (?,?,?,?,?)",
+                (repo, filepath, severities["high"], severities["medium"], severities["low"])
+            )
+            delta = [severities[level] - old for level, old in zip(("high", "medium", "low"), previous)]
+
+            row = conn.execute("SELECT rolling_summary FROM repo_aggregates WHERE repo=?", (repo,)).fetchone()
+            # newest feedback first, capped at REPO_SUMMARY_CHARS
+            summary = f"{review_text} {row[0]}" if row and row[0] else review_text
+            conn.execute("""INSERT INTO repo_aggregates
+                (repo, file_count, review_count, high, medium, low, last_reviewed_at, rolling_summary)
+                VALUES (?, 1, 1, ?, ?, ?, ?, ?)
+                ON CONFLICT(repo) DO UPDATE SET
+                    file_count = file_count + ?,
+                    review_count = review_count + 1,
+                    high = high + excluded.high,
+                    medium = medium + excluded.medium,
+                    low = low + excluded.low,
+                    last_reviewed_at = excluded.last_reviewed_at,
+                    rolling_summary = excluded.rolling_summary""",
+                (repo, *delta, reviewed_at, summary[:REPO_SUMMARY_CHARS], 0 if seen else 1)
+            )
+            return rowid
+        return self.writer.submit(write)
 
     def summarize_repo(self, repo: str):
-        cursor = self.conn.execute("SELECT review_text FROM reviews WHERE repo=?", (repo,))
-        texts = [r[0] for r in cursor.fetchall()]
-        summary = ' '.join(texts)[:1000]
-        return {"repo": repo, "short_summary": summary}
-
-    def insert_job(self, job: FinalReview, code: Optional[str], filename: Optional[str], repo: Optional[str]):
-        result_str = json.dumps(job.result.dict()) if job.result else None
-        self.conn.execute(
-            "INSERT INTO jobs (job_id, status, code, filename, repo, result, error) VALUES (?,?,?,?,?,?,?)",
-            (job.job_id, job.status, code, filename, repo, result_str, job.error)
-        )
-        self.conn.commit()
+        row = self.conn.execute(
+            "SELECT file_count, review_count, high, medium, low, last_reviewed_at, rolling_summary "
+            "FROM repo_aggregates WHERE repo=?", (repo,)
+        ).fetchone()
+        if not row:
+            return {"repo": repo, "short_summary": "", "file_count": 0, "review_count": 0,
+                    "security_findings": {"high": 0, "medium": 0, "low": 0}, "last_reviewed_at": None}
+        return {
+            "repo": repo,
+            "short_summary": row[6] or "",
+            "file_count": row[0],
+            "review_count": row[1],
+            "security_findings": {"high": row[2], "medium": row[3], "low": row[4]},
+            "last_reviewed_at": row[5],
+        }
 
-    def update_job(self, job: FinalReview):
-        result_str = json.dumps(job.result[0].review.dict()) if job.result else None
-        self.conn.execute(
-            "UPDATE jobs SET status=?, result=?, error=? WHERE job_id=?",
-            (job.status, result_str, job.error, job.job_id)
-        )
-        self.conn.commit()
+    def search_reviews(self, query: str, repo: Optional[str] = None, limit: int = 20, offset: int = 0) -> List[dict]:
+        """Full-text search over review text, best matches first."""
+        if self.fts_enabled:
+            # quote every term so user input is never parsed as FTS5 syntax
+            match = " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+            if not match:
+                return []
+            sql = ("SELECT r.repo, r.filepath, snippet(reviews_fts, 0, '[', ']', '...', 16) "
+                   "FROM reviews_fts JOIN reviews r ON r.rowid = reviews_fts.rowid "
+                   "WHERE reviews_fts MATCH ?")
+            params: list = [match]
+            if repo:
+                sql += " AND r.repo = ?"
+                params.append(repo)
+            sql += " ORDER BY rank LIMIT ? OFFSET ?"
+        else:
+            sql = "SELECT repo, filepath, substr(review_text, 1, 200) FROM reviews WHERE review_text LIKE ?"
+            params = [f"%{query}%"]
+            if repo:
+                sql += " AND repo = ?"
+                params.append(repo)
+            sql += " ORDER BY rowid DESC LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        with timed("db_search"):
+            rows = self.conn.execute(sql, params).fetchall()
+        return [{"repo": r[0], "filepath": r[1], "snippet": r[2]} for r in rows]
+
+    def get_repo_snapshot(self, git_url: str) -> Tuple[Optional[str], Dict[str, Tuple[str, Optional[str], ReviewOutput]]]:
+        """Last reviewed commit of `git_url` and {path: (blob sha, review config, review)} at that commit."""
+        with timed("db_snapshot_read"):
+            row = self.conn.execute("SELECT commit_sha FROM repo_snapshots WHERE git_url=?", (git_url,)).fetchone()
+            rows = self.conn.execute(
+                "SELECT path, blob_sha, review_config, review FROM repo_snapshot_files WHERE git_url=?", (git_url,)
+            ).fetchall() if row else []
+        if not row:
+            return None, {}
+        files = {}
+        for path, blob_sha, review_config, review in rows:
+            try:
+                files[path] = (blob_sha, review_config, ReviewOutput.model_validate_json(review))
+            except Exception:
+                continue
+        return row[0], files
+
+    def save_repo_snapshot(self, git_url: str, commit_sha: str, files: List[FileReview],
+                           review_configs: Dict[str, str]) -> Future:
+        """Replace the stored state of `git_url`; files without a review are re-reviewed next time.
+
+        `review_configs` maps repo paths to the engine config key their reviews were made with.
+        """
+        rows = [(git_url, f.repo_path, f.blob_sha, review_configs.get(f.repo_path), f.review.model_dump_json())
+                for f in files if f.review and f.repo_path and f.blob_sha]
+        reviewed_at = time.time()
 
-    def get_job(self, job_id: str) -> Optional[FinalReview]:
-        cursor = self.conn.execute(
-            "SELECT job_id, status, code, filename, repo, result, error FROM jobs WHERE job_id=?",
-            (job_id,)
+        def write(conn: sqlite3.Connection):
+            conn.execute("DELETE FROM repo_snapshot_files WHERE git_url=?", (git_url,))
+            conn.executemany(
+                "INSERT INTO repo_snapshot_files (git_url, path, blob_sha, review_config, review) VALUES (?,?,?,?,?)",
+                rows
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO repo_snapshots (git_url, commit_sha, reviewed_at) VALUES (?,?,?)",
+                (git_url, commit_sha, reviewed_at)
+            )
+        return self.writer.submit(write)
+
+    def insert_job(self, job: FinalReview, code: Optional[str], filename: Optional[str], repo: Optional[str],
+                   payload: Optional[dict] = None, lane: Optional[str] = None) -> Future:
+        """Insert a job; with a payload it is queued for a worker to claim (JobQueue.enqueue also bounds the queue)."""
+        return self.writer.execute(INSERT_JOB, job_row(job, code, filename, repo, payload, lane))
+
+    def update_job(self, job: FinalReview) -> Future:
+        return self.writer.execute(
+            "UPDATE jobs SET status=?, result=?, error=?, updated_at=? WHERE job_id=?",
+            (job.status, serialize_results(job.result), job.error, time.time(), job.job_id)
         )
-        row = cursor.fetchone()
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        with timed("db_get_job"):
+            row = self.conn.execute(
+                "SELECT job_id, status, code, filename, repo, result, error, attempts, architecture, timings "
+                "FROM jobs WHERE job_id=?",
+                (job_id,)
+            ).fetchone()
         if not row:
             return None
 
-        result_obj = None
-        if row[5]:
-            try:
-                result_obj = ReviewOutput.model_validate(json.loads(row[5]))
-            except:
-                result_obj = None
-
         return Job(
             job_id=row[0],
             status=row[1],
             code=row[2],
             filename=row[3],
             repo=row[4],
-            result=result_obj,
-            error=row[6]
-        )
\ No newline at end of file
+            result=deserialize_results(row[5]),
+            error=row[6],
+            attempts=row[7] or 0,
+            architecture=RepoArchitecture.model_validate_json(row[8]) if row[8] else None,
+            timings=json.loads(row[9]) if row[9] else None
+        )
+
+    def get_module_summary(self, content_hash: str) -> Optional[dict]:
+        row = self.conn.execute(
+            "SELECT summary FROM module_summaries WHERE content_hash=?", (content_hash,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_module_summary(self, content_hash: str, summary: dict) -> Future:
+        return self.writer.execute(
+            "INSERT OR IGNORE INTO module_summaries (content_hash, summary) VALUES (?,?)",
+            (content_hash, json.dumps(summary))
+        )
+
+
+class ReviewCache:
+    """Content-addressed store of ReviewOutput objects with LRU eviction.
+
+    Keys come from ``BaseReviewEngine.cache_key`` so a hit means the same file
+    contents were reviewed by the same engine, model, prompt and corpus. All
+    mutations run on the database's batching writer thread. Lookups only read:
+    hit/miss counts and access times are gathered in memory and written every
+    REVIEW_CACHE_FLUSH_SECONDS. Size bounds are checked against COUNT/SUM in
+    the write transaction, so processes sharing the database agree on them.
+    """
+
+    def __init__(self, db_path="reviews.db", max_entries: int = REVIEW_CACHE_MAX_ENTRIES,
+                 max_bytes: int = REVIEW_CACHE_MAX_BYTES):
+        self._connections = ThreadLocalConnections(db_path)
+        self.writer = get_writer(db_path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.writer.submit(self._create_schema).result()
+        self._stats_lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0}
+        self._accessed: Dict[str, Tuple[float, int]] = {}  # key -> (last access, hits) since the last flush
+        self._flushed_at = time.monotonic()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection):
+        conn.execute("""CREATE TABLE IF NOT EXISTS review_cache (
+            key TEXT PRIMARY KEY,
+            output TEXT,
+            size INTEGER,
+            created_at REAL,
+            last_access REAL,
+            hits INTEGER DEFAULT 0
+        )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_review_cache_last_access ON review_cache(last_access)")
+        conn.execute("""CREATE TABLE IF NOT EXISTS review_cache_stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER
+        )""")
+
+    @staticmethod
+    def _totals(conn: sqlite3.Connection) -> Tuple[int, int]:
+        return conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM review_cache").fetchone()
+
+    def get(self, key: str) -> Optional[ReviewOutput]:
+        with timed("cache_lookup"):
+            row = self.conn.execute("SELECT output FROM review_cache WHERE key=?", (key,)).fetchone()
+        output = None
+        if row:
+            try:
+                output = ReviewOutput.model_validate_json(row[0])
+            except Exception:
+                self.writer.submit(lambda conn: self._remove(conn, key))
+        with self._stats_lock:
+            if output is None:
+                self._counts["misses"] += 1
+            else:
+                self._counts["hits"] += 1
+                self._accessed[key] = (time.time(), self._accessed.get(key, (0.0, 0))[1] + 1)
+            due = time.monotonic() - self._flushed_at >= REVIEW_CACHE_FLUSH_SECONDS
+        if due:
+            self.flush_stats()
+        return output
+
+    def flush_stats(self) -> Future:
+        """Write the hit/miss counts and access times gathered since the last flush."""
+        with self._stats_lock:
+            counts, self._counts = self._counts, {"hits": 0, "misses": 0}
+            accessed, self._accessed = self._accessed, {}
+            self._flushed_at = time.monotonic()
+
+        def write(conn: sqlite3.Connection):
+            conn.executemany(
+                "UPDATE review_cache SET last_access=MAX(last_access, ?), hits=hits+? WHERE key=?",
+                [(last_access, hits, key) for key, (last_access, hits) in accessed.items()]
+            )
+            for name, amount in counts.items():
+                if amount:
+                    self._bump(conn, name, amount)
+        return self.writer.submit(write)
+
+    def _remove(self, conn: sqlite3.Connection, key: str):
+        # runs on the writer thread; drops an entry that no longer validates
+        conn.execute("DELETE FROM review_cache WHERE key=?", (key,))
+
+    def put(self, key: str, output: ReviewOutput) -> Optional[Future]:
+        payload = output.model_dump_json()
+        size = len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return None
+        now = time.time()
+
+        def write(conn: sqlite3.Connection):
+            conn.execute(
+                "INSERT OR REPLACE INTO review_cache (key, output, size, created_at, last_access, hits) "
+                "VALUES (?,?,?,?,?,0)",
+                (key, payload, size, now, now)
+            )
+            self._evict(conn)
+        return self.writer.submit(write)
+
+    def _evict(self, conn: sqlite3.Connection):
+        # runs on the writer thread; drop least recently used entries until within bounds
+        entries, total_bytes = self._totals(conn)
+        while entries > self.max_entries or total_bytes > self.max_bytes:
+            rows = conn.execute(
+                "SELECT key, size FROM review_cache ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if entries <= self.max_entries and total_bytes <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM review_cache WHERE key=?", (key,))
+                entries -= 1
+                total_bytes -= size
+                self._bump(conn, "evictions")
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, name: str, amount: int = 1):
+        conn.execute(
+            "INSERT INTO review_cache_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value=value+excluded.value",
+            (name, amount)
+        )
+
+    def stats(self) -> dict:
+        counters = dict(self.conn.execute("SELECT name, value FROM review_cache_stats").fetchall())
+        entries, total_bytes = self._totals(self.conn)
+        with self._stats_lock:
+            hits = counters.get("hits", 0) + self._counts["hits"]
+            misses = counters.get("misses", 0) + self._counts["misses"]
+        return {
+            "entries": entries,
+            "bytes": total_bytes,
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
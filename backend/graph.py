@@ -0,0 +1,56 @@
+from typing import Any, Dict, List, Tuple
+
+def dot_quote(value: str) -> str:
+    """A DOT double-quoted string showing `value` literally."""
+    escaped = (
+        value.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+        .replace("\r", "\\n")
+    )
+    return f'"{escaped}"'
+
+class CodeGraph:
+    """Small directed graph with typed, labelled nodes and one relation per edge.
+
+    Mirrors the networkx DiGraph usage of the analyzers (re-adding a node or an
+    edge updates it) at a fraction of the cost, and renders DOT and JSON directly.
+    Nodes and edges keep insertion order, so output is deterministic.
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, Tuple[str, str]] = {}  # id -> (type, label)
+        self.edges: Dict[Tuple[str, str], str] = {}  # (source, target) -> relation
+
+    def add_node(self, node_id: str, type: str, label: str):
+        self.nodes[node_id] = (type, label)
+
+    def add_edge(self, source: str, target: str, relation: str = ""):
+        self.edges[(source, target)] = relation
+
+    def to_dot(self) -> str:
+        lines = ['strict digraph "" {']
+        for node_id, (node_type, label) in self.nodes.items():
+            lines.append(f"\t{dot_quote(node_id)} [label={dot_quote(label)}, type={dot_quote(node_type)}];")
+        for (source, target), relation in self.edges.items():
+            attrs = f" [label={dot_quote(relation)}]" if relation else ""
+            lines.append(f"\t{dot_quote(source)} -> {dot_quote(target)}{attrs};")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {
+            "nodes": [{"id": n, "type": t, "label": label} for n, (t, label) in self.nodes.items()],
+            "edges": [{"source": s, "target": t, "relation": r} for (s, t), r in self.edges.items()],
+        }
+
+    def to_networkx(self):
+        """The same graph as a networkx DiGraph (networkx is only needed here)."""
+        import networkx as nx
+        G = nx.DiGraph()
+        for node_id, (node_type, label) in self.nodes.items():
+            G.add_node(node_id, type=node_type, label=label)
+        for (source, target), relation in self.edges.items():
+            G.add_edge(source, target, relation=relation)
+        return G
@@ -0,0 +1,248 @@
+import os
+import json
+import math
+import time
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+from db import INSERT_JOB, ReviewDB, job_row, serialize_results
+from schemas import FileReview, FinalReview, QueueStatus, RepoArchitecture, ReviewRequest
+from models.job_status import JobStatus
+from utils import cleanup_path
+
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+INTERACTIVE, BULK = "interactive", "bulk"
+# pending jobs admitted per lane before new ones are rejected; 0 means unbounded
+LANE_DEPTH = {
+    INTERACTIVE: int(os.getenv("JOB_QUEUE_DEPTH_INTERACTIVE", "200")),
+    BULK: int(os.getenv("JOB_QUEUE_DEPTH_BULK", "20")),
+}
+# bulk jobs are claimed as if queued this much later: snippets overtake them, but they are not starved
+JOB_BULK_DELAY_SECONDS = float(os.getenv("JOB_BULK_DELAY_SECONDS", "300"))
+# claim order of a job; jobs queued before lanes existed count as interactive
+ORDER_KEY = "created_at + CASE WHEN lane = 'bulk' THEN ? ELSE 0 END"
+RETRY_AFTER_DEFAULT_SECONDS = 30
+JOB_SECONDS_SAMPLE = 200  # recent jobs averaged for wait estimates
+JOB_SECONDS_TTL = 5.0
+
+def job_lane(request: ReviewRequest) -> str:
+    """Repositories and archives go to the bulk lane, single files and snippets to the interactive one."""
+    return BULK if request.git_url or request.uploaded_file_path else INTERACTIVE
+
+def cleanup_job(payload: dict):
+    """Remove temporary inputs (uploads) once a job will not be retried."""
+    for path in payload.get("cleanup") or []:
+        cleanup_path(path)
+
+class QueueFull(Exception):
+    def __init__(self, lane: str, depth: int):
+        super().__init__(f"The {lane} job queue is full ({depth} jobs pending), retry later")
+        self.lane = lane
+        self.depth = depth
+
+class JobQueue:
+    """Durable job queue on top of the `jobs` table.
+
+    A worker claims the oldest pending job (or a running one whose lease has
+    expired), bulk jobs counting as JOB_BULK_DELAY_SECONDS younger, and holds a
+    lease on it, renewed by heartbeats. Each lane admits at most LANE_DEPTH
+    pending jobs. A job whose worker
+    dies is claimed again once the lease runs out, up to `max_attempts`
+    attempts. Writes go through the database's batching writer, whose
+    transactions take SQLite's write lock, so claims are atomic across threads
+    and processes.
+    """
+
+    def __init__(self, db: ReviewDB, lease_seconds: float = JOB_LEASE_SECONDS):
+        self.db = db
+        self.lease_seconds = lease_seconds
+        self._job_seconds: Dict[str, float] = {}
+        self._job_seconds_at = 0.0
+        self._job_seconds_lock = threading.Lock()
+
+    def enqueue(self, job: FinalReview, code: Optional[str], filename: Optional[str], repo: Optional[str],
+                payload: dict, lane: str = INTERACTIVE) -> Future:
+        """Insert a pending job. The future raises QueueFull if its lane is at LANE_DEPTH."""
+        max_depth = LANE_DEPTH.get(lane, 0)
+        row = job_row(job, code, filename, repo, payload, lane)
+
+        def write(conn: sqlite3.Connection):
+            # counted in the insert's transaction, so concurrent requests cannot overfill the lane
+            if max_depth:
+                depth = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status=? AND COALESCE(lane, ?)=?",
+                    (JobStatus.PENDING.value, INTERACTIVE, lane)
+                ).fetchone()[0]
+                if depth >= max_depth:
+                    raise QueueFull(lane, depth)
+            conn.execute(INSERT_JOB, row)
+        return self.db.writer.submit(write)
+
+    def claim(self, worker_id: str) -> Optional[Tuple[str, dict, int, float]]:
+        """Lease the next runnable job. Returns (job_id, payload, attempt number, seconds since queued) or None.
+
+        Jobs failed on the way (retry limit reached, payload unreadable) have their uploads removed.
+        """
+        claimed, abandoned = self.db.writer.submit(lambda conn: self._claim(conn, worker_id)).result()
+        for payload in abandoned:
+            cleanup_job(payload)
+        return claimed
+
+    def _claim(self, conn: sqlite3.Connection,
+               worker_id: str) -> Tuple[Optional[Tuple[str, dict, int, float]], List[dict]]:
+        now = time.time()
+        abandoned: List[dict] = []  # payloads of jobs failed here, cleaned up once the transaction commits
+        while True:
+            row = conn.execute(
+                "SELECT job_id, payload, attempts, max_attempts, code, filename, repo, created_at FROM jobs "
+                "WHERE status=? OR (status=? AND lease_expires_at < ?) "
+                f"ORDER BY {ORDER_KEY} LIMIT 1",
+                (JobStatus.PENDING.value, JobStatus.RUNNING.value, now, JOB_BULK_DELAY_SECONDS)
+            ).fetchone()
+            if not row:
+                return None, abandoned
+            job_id, payload, attempts, max_attempts, code, filename, repo, created_at = row
+            attempts = attempts or 0
+
+            if payload:
+                try:
+                    request = json.loads(payload)
+                except ValueError:
+                    request = None
+            elif code:
+                # queued before payloads were stored: raw code jobs can still be rebuilt
+                request = {"request": {"code": code, "filename": filename, "repo": repo}}
+            else:
+                request = None
+
+            if request is None or attempts >= (max_attempts or 1):
+                error = "Job exceeded its retry limit" if request is not None else "Job cannot be resumed"
+                conn.execute(
+                    "UPDATE jobs SET status=?, error=?, lease_owner=NULL, lease_expires_at=NULL, updated_at=? "
+                    "WHERE job_id=?",
+                    (JobStatus.FAILED.value, error, now, job_id)
+                )
+                if request is not None:
+                    abandoned.append(request)
+                continue
+
+            conn.execute(
+                "UPDATE jobs SET status=?, lease_owner=?, lease_expires_at=?, heartbeat_at=?, attempts=?, "
+                "updated_at=? WHERE job_id=?",
+                (JobStatus.RUNNING.value, worker_id, now + self.lease_seconds, now, attempts + 1, now, job_id)
+            )
+            return (job_id, request, attempts + 1, max(0.0, now - created_at) if created_at else 0.0), abandoned
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Extend the lease. False means the lease was lost to another worker."""
+        now = time.time()
+        updated = self.db.writer.execute(
+            "UPDATE jobs SET lease_expires_at=?, heartbeat_at=? WHERE job_id=? AND lease_owner=? AND status=?",
+            (now + self.lease_seconds, now, job_id, worker_id, JobStatus.RUNNING.value)
+        ).result()
+        return updated > 0
+
+    def complete(self, job_id: str, worker_id: str, files: List[FileReview],
+                 architecture: Optional[RepoArchitecture] = None, timings: Optional[Dict[str, float]] = None) -> bool:
+        updated = self.db.writer.execute(
+            "UPDATE jobs SET status=?, result=?, architecture=?, timings=?, error=NULL, lease_owner=NULL, "
+            "lease_expires_at=NULL, updated_at=? WHERE job_id=? AND lease_owner=?",
+            (JobStatus.COMPLETED.value, serialize_results(files),
+             architecture.model_dump_json() if architecture else None,
+             json.dumps(timings) if timings else None, time.time(), job_id, worker_id)
+        ).result()
+        return updated > 0
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = True,
+             timings: Optional[Dict[str, float]] = None) -> Optional[str]:
+        """Release a failed attempt: back to pending while attempts remain, else failed.
+
+        `timings` of the failed attempt are kept on the job. Returns the job's new
+        status, or None if this worker no longer held the lease.
+        """
+        def write(conn: sqlite3.Connection):
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE job_id=? AND lease_owner=?", (job_id, worker_id)
+            ).fetchone()
+            if not row:
+                return None
+            status = JobStatus.PENDING if retry and (row[0] or 0) < (row[1] or 1) else JobStatus.FAILED
+            conn.execute(
+                "UPDATE jobs SET status=?, error=?, timings=?, lease_owner=NULL, lease_expires_at=NULL, updated_at=? "
+                "WHERE job_id=?",
+                (status.value, error, json.dumps(timings) if timings else None, time.time(), job_id)
+            )
+            return status.value
+        return self.db.writer.submit(write).result()
+
+    def depths(self) -> Dict[str, int]:
+        """Pending jobs per lane."""
+        depths = dict.fromkeys(LANE_DEPTH, 0)
+        for lane, count in self.db.conn.execute(
+            "SELECT COALESCE(lane, ?), COUNT(*) FROM jobs WHERE status=? GROUP BY 1",
+            (INTERACTIVE, JobStatus.PENDING.value)
+        ):
+            depths[lane] = count
+        return depths
+
+    def job_seconds(self) -> Dict[str, float]:
+        """Mean run time per lane of recently completed jobs, refreshed every JOB_SECONDS_TTL seconds."""
+        with self._job_seconds_lock:
+            if time.monotonic() - self._job_seconds_at < JOB_SECONDS_TTL:
+                return self._job_seconds
+            samples: Dict[str, List[float]] = {}
+            for lane, timings in self.db.conn.execute(
+                "SELECT COALESCE(lane, ?), timings FROM jobs WHERE status=? AND timings IS NOT NULL "
+                "ORDER BY rowid DESC LIMIT ?",
+                (INTERACTIVE, JobStatus.COMPLETED.value, JOB_SECONDS_SAMPLE)
+            ):
+                seconds = json.loads(timings).get("job")
+                if seconds is not None:
+                    samples.setdefault(lane, []).append(seconds)
+            self._job_seconds = {lane: sum(values) / len(values) for lane, values in samples.items()}
+            self._job_seconds_at = time.monotonic()
+            return self._job_seconds
+
+    def _running(self) -> Dict[str, int]:
+        """Jobs per lane currently held by a worker."""
+        return dict(self.db.conn.execute(
+            "SELECT COALESCE(lane, ?), COUNT(*) FROM jobs WHERE status=? AND lease_expires_at >= ? GROUP BY 1",
+            (INTERACTIVE, JobStatus.RUNNING.value, time.time())
+        ).fetchall())
+
+    def queue_status(self, job_id: str) -> Optional[QueueStatus]:
+        """Position, lane depth and a rough wait estimate of a pending job; None once it is claimed."""
+        row = self.db.conn.execute(
+            f"SELECT COALESCE(lane, ?), {ORDER_KEY} FROM jobs WHERE job_id=? AND status=?",
+            (INTERACTIVE, JOB_BULK_DELAY_SECONDS, job_id, JobStatus.PENDING.value)
+        ).fetchone()
+        if not row:
+            return None
+        lane, key = row
+        ahead = dict(self.db.conn.execute(
+            f"SELECT COALESCE(lane, ?), COUNT(*) FROM jobs WHERE status=? AND {ORDER_KEY} < ? GROUP BY 1",
+            (INTERACTIVE, JobStatus.PENDING.value, JOB_BULK_DELAY_SECONDS, key)
+        ).fetchall())
+        running = self._running()
+        job_seconds = self.job_seconds()
+        wait = None
+        if all(l in job_seconds for l in (*ahead, *running)):
+            # the jobs ahead run in full, running ones are assumed half done; workers drain them in parallel
+            work = sum(job_seconds[l] * n for l, n in ahead.items())
+            work += sum(job_seconds[l] * n / 2 for l, n in running.items())
+            wait = round(work / max(1, sum(running.values())), 1)
+        return QueueStatus(
+            lane=lane,
+            position=sum(ahead.values()) + 1,
+            depth=self.depths().get(lane, 0),
+            estimated_wait_seconds=wait
+        )
+
+    def retry_after(self, lane: str) -> int:
+        """Seconds until a full lane is likely to have room for another job."""
+        seconds = self.job_seconds().get(lane)
+        if seconds is None:
+            return RETRY_AFTER_DEFAULT_SECONDS
+        return max(1, math.ceil(seconds / max(1, sum(self._running().values()))))
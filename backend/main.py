@@ -3,17 +3,27 @@ import asyncio
 import shutil
 import tempfile
 from uuid import uuid4
-from db import ReviewDB
-from typing import Dict, List
-from concurrent.futures import ThreadPoolExecutor
+from typing import List
 from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from schemas import FileReview, ReviewRequest, FinalReview
+from schemas import ReviewRequest, FinalReview
 from models.job_status import JobStatus
-from prepare_files import prepare_files
-from review_engines.base import BaseReviewEngine
-from review_engines.python_engine import PythonReviewEngine
+from prepare_files import iter_zip_files
+from utils import ArchiveLimitError, cleanup_path
+from static_analysis import shutdown_analysis_pool
+from streaming import format_sse
+from job_queue import JobQueue, QueueFull, job_lane
+from model_registry import MODEL_WARMUP, get_model_registry
+from pipeline import db, review_cache, executor, jobs, events
+from worker import JobWorker
 from core.logging_config import logger
+from core.metrics import CONTENT_TYPE, Counter, Gauge, render_metrics
+
+# "embedded": this process also runs a worker; "queue": only enqueue, jobs run in `python worker.py`
+JOB_EXECUTION = os.getenv("JOB_EXECUTION", "embedded")
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "codelens-uploads"))
+STREAM_POLL_SECONDS = 1.0
 
 cors_origins = [os.getenv("FRONTEND_ORIGIN", "http://localhost:3000")]
 
@@ -26,101 +36,98 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Engine registry
-engines: Dict[str, BaseReviewEngine] = {
-    "py": PythonReviewEngine(use_gpu=True),
-    # "cs": CSharpReviewEngine(use_gpu=True),  # Future extension
-}
-
-db = ReviewDB("reviews.db")
-executor = ThreadPoolExecutor(max_workers=4)
-jobs: Dict[str, FinalReview] = {}
-
-def get_engine(filename: str) -> BaseReviewEngine:
-    """Return the correct engine based on file extension. Defaults to Python."""
-    if not filename:
-        return engines["py"]
-    ext = os.path.splitext(filename)[1].lstrip('.').lower()
-    return engines.get(ext, engines["py"])
-
-async def process_file(file_review: FileReview, repo: str = None) -> FileReview:
-    try:
-        logger.info(f"Processing file: {file_review.filename}")
-
-        """Process a single FileReview object and store result in DB."""
-        loop = asyncio.get_running_loop()
-        engine = get_engine(file_review.filename)
+queue = JobQueue(db)
+embedded_worker = JobWorker(queue) if JOB_EXECUTION == "embedded" else None
 
-        logger.info("Analyzing code and generating feedback...")
-        result = await loop.run_in_executor(executor, engine.review, file_review.code, file_review.filename)
-
-        db.insert_review(
-            repo=repo or "local",
-            filepath=file_review.filename or "<stdin>",
-            review_text=result.final_feedback
-        )
-
-        file_review.review = result  # attach ReviewOutput
-        return file_review
-    
-    except Exception as e:
-        logger.exception(f"Exception while processing file for filename:'{file_review.filename}'.\n {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+QUEUE_DEPTH = Gauge(
+    "codelens_queue_depth", "Pending jobs per lane", labels=("lane",),
+    read=lambda: {(lane,): depth for lane, depth in queue.depths().items()}
+)
+JOBS_REJECTED = Counter("codelens_jobs_rejected_total", "Jobs refused because their lane was full", labels=("lane",))
 
-async def process_job(job_id: str, files: List[FileReview], repo: str = None):
-    """Process multiple files for a job concurrently."""
-    job = jobs[job_id]
-    try:
-        processed_files = []
-        for file_review in files:
-            processed_files.append(await process_file(file_review, repo))
-        job.status = JobStatus.COMPLETED
-        job.result = processed_files
-        job.error = None
-        logger.info(f"Completed job processing for job_id: '{job_id}'")
-    except Exception as e:
-        job.status = JobStatus.FAILED
-        job.result = None
-        job.error = str(e)
-        logger.exception(f"Exception while processing job_id: '{job_id}'.\n {e}")
-    finally:
-        db.update_job(job)
-        logger.info(f"Updating job for job_id: '{job_id}' with final status={job.status}")
+async def schedule_job(request: ReviewRequest, repo: str, code: str="", filename: str=None,
+                       cleanup: List[str] = None):
+    """Queue a job; a worker (embedded or standalone) claims and processes it.
 
-async def schedule_job(files, repo: str, code: str="", filename: str=None):
+    Answers 429 with Retry-After when the job's lane is full.
+    """
+    lane = job_lane(request)
     try:
         job_id = str(uuid4())
         job = FinalReview(job_id=job_id, status=JobStatus.PENDING, result=None, error=None)
-        jobs[job_id] = job
-
-        # store initial job in DB
-        db.insert_job(job=job, code=code or "", filename=filename, repo=repo)
-        logger.info(f"Creating new job for job_id='{job_id}'")
+        payload = {"request": request.model_dump(exclude_none=True), "cleanup": cleanup or []}
 
-        asyncio.create_task(process_job(job_id, files, repo))
+        # the job is durable once committed; workers claim it from the DB
+        insert = queue.enqueue(job=job, code=code or "", filename=filename, repo=repo, payload=payload, lane=lane)
+        await asyncio.wrap_future(insert)
+        logger.info(f"Creating new job for job_id='{job_id}' in the {lane} lane")
+        job.queue = queue.queue_status(job_id)
         return job
-    
+
+    except QueueFull as e:
+        JOBS_REJECTED.inc(labels=(lane,))
+        logger.warning(f"Rejected job: {e}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(queue.retry_after(lane))})
     except Exception as e:
         logger.exception(f"Error creating or scheduling job: {e}")
         raise HTTPException(status_code=500, detail="Internal job creation error")
 
+@app.on_event("startup")
+async def start_worker():
+    if MODEL_WARMUP and embedded_worker:
+        # loads in the background: /health answers at once, /ready once the models are in
+        asyncio.get_running_loop().run_in_executor(None, get_model_registry().warmup)
+    if embedded_worker:
+        asyncio.create_task(embedded_worker.run())
+
+@app.on_event("shutdown")
+async def shutdown_pools():
+    if embedded_worker:
+        await embedded_worker.stop()
+    shutdown_analysis_pool()
+    executor.shutdown(wait=False)
+    review_cache.flush_stats()
+    db.writer.flush()
+
 # --- API Endpoints ---
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
+@app.get("/ready")
+def readiness_check():
+    """Model load state. Not ready while a model is loading or failed to load, or before warm-up finishes."""
+    registry = get_model_registry()
+    models = registry.status() if embedded_worker else {}
+    states = {m["state"] for m in models.values()}
+    warming_up = MODEL_WARMUP and embedded_worker and not registry.warmed_up
+    ready = not states & {"loading", "failed"} and not warming_up
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "models": models}
+    )
+
+@app.get("/metrics")
+def metrics():
+    """Stage timings, executor occupancy, LLM throughput and DB writer stats in the Prometheus text format."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
 @app.post("/review")
 async def review_code(input: ReviewRequest):
     logger.info("Starting ReviewEngine")
-    files = prepare_files(input)
+    local_file = input.filename and not input.code and os.path.exists(input.filename)
+    if local_file:
+        # workers run in other processes, possibly from another directory: send the contents, not the path
+        with open(input.filename, 'r', encoding='utf-8') as f:
+            input = input.model_copy(update={"code": f.read()})
 
-    if not files:
+    if not (input.code or input.uploaded_file_path or input.git_url):
         logger.exception("Error: No valid code files found to review.")
         raise HTTPException(status_code=400, detail="No valid code files found to review")
 
     # schedule job for completion
     return await schedule_job(
-        files=files, 
+        request=input,
         repo=input.repo or "local",
         code=input.code or "",
         filename=input.filename
@@ -128,70 +135,128 @@ async def review_code(input: ReviewRequest):
 
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=UPLOAD_DIR)
+    scheduled = False
     try:
         logger.info("Starting ReviewEngine")
-        tmp_dir = tempfile.mkdtemp()
-        file_path = os.path.join(tmp_dir, file.filename)
+        file_path = os.path.join(tmp_dir, os.path.basename(file.filename))
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
 
         repo = "upload"
 
-        review_request = ReviewRequest(uploaded_file_path=file_path, filename = file.filename, repo=repo)
-        files = prepare_files(review_request)
+        if os.path.splitext(file_path)[1].lower() == ".zip":
+            # validate the archive here; a worker streams its members and removes it when the job finishes
+            first = next(iter_zip_files(file_path), None)
+            if first is None:
+                raise HTTPException(status_code=400, detail="No valid code files found in archive")
+            job = await schedule_job(
+                request=ReviewRequest(uploaded_file_path=file_path, filename=file.filename, repo=repo),
+                repo=repo,
+                code=first.code or "",
+                filename=file.filename,
+                cleanup=[tmp_dir]
+            )
+            scheduled = True
+            return job
 
-        if not files:
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                code = f.read()
+        except UnicodeDecodeError:
+            code = ""
+        if not code:
             logger.exception("Error: No valid code files found to review (Unsupported or empty file)")
             raise HTTPException(status_code=400, detail="Unsupported or empty file")
-        
+
         return await schedule_job(
-            files=files,
+            request=ReviewRequest(code=code, filename=file.filename, repo=repo),
             repo=repo,
-            code=files[0].code or "",
+            code=code,
             filename=file.filename
         )
+    except HTTPException:
+        raise
+    except ArchiveLimitError as e:
+        logger.warning(f"Rejected archive upload: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.exception(f"Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if not scheduled:
+            cleanup_path(tmp_dir)
 
 
 @app.get("/status/{job_id}", response_model=FinalReview)
 async def check_status(job_id: str):
     try:
         logger.info(f"Checking status for job_id: '{job_id}'")
-        
+
         job = jobs.get(job_id)
         if job:
             return job
 
         job_from_db = db.get_job(job_id)
-        
+
         if not job_from_db:
             logger.exception("Error. job not found")
             raise HTTPException(status_code=404, detail="Job not found")
 
-        if job_from_db.status == JobStatus.PENDING:
-            # reconstruct ReviewRequest to prepare files again
-            files = prepare_files(ReviewRequest(
-                code=job_from_db.code,
-                filename=job_from_db.filename,
-                repo=job_from_db.repo
-            ))
-
-            job = await schedule_job(
-                files=files,
-                repo=job_from_db.repo,
-                code=job_from_db.code,
-                filename=job_from_db.filename
-            )
-            return job
+        return FinalReview(
+            job_id=job_from_db.job_id,
+            status=job_from_db.status,
+            result=job_from_db.result,
+            error=job_from_db.error,
+            architecture=job_from_db.architecture,
+            timings=job_from_db.timings,
+            queue=queue.queue_status(job_id) if job_from_db.status == JobStatus.PENDING else None
+        )
 
-        return job_from_db
-    
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.exception("Error while checking status: {e}")
+        logger.exception(f"Error while checking status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/stream/{job_id}")
+async def stream_job(job_id: str):
+    """Server-sent events: file progress, generated tokens and a final job event.
+
+    Events come from this process while it runs the job; otherwise the job row is
+    polled until it finishes (or this process claims it).
+    """
+    if not events.is_open(job_id) and not jobs.get(job_id) and not db.get_job(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def job_events():
+        while True:
+            if events.is_open(job_id):
+                last = None
+                async for message in events.subscribe(job_id):
+                    last = message["event"]
+                    yield message
+                if last != "job_requeued":
+                    return
+                continue  # another worker (or this one) may claim the job again
+            job = db.get_job(job_id)
+            if job and job.status in (JobStatus.COMPLETED, JobStatus.FAILED):
+                name = "job_failed" if job.status == JobStatus.FAILED else "job_completed"
+                yield {"event": name, "data": {"job_id": job_id, "status": job.status, "error": job.error}}
+                return
+            await asyncio.sleep(STREAM_POLL_SECONDS)
+
+    async def body():
+        async for message in job_events():
+            yield format_sse(message)
+
+    return StreamingResponse(body(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/cache-stats")
+def cache_stats():
+    return review_cache.stats()
+
 @app.get("/repo-summary")
 def repo_summary(repo: str = None):
     try:
@@ -199,3 +264,12 @@ def repo_summary(repo: str = None):
         return {"repo": repo, "summary": summary}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/search")
+def search_reviews(q: str, repo: str = None, limit: int = 20, offset: int = 0):
+    try:
+        limit = max(1, min(limit, 100))
+        results = db.search_reviews(q, repo=repo, limit=limit, offset=max(0, offset))
+        return {"query": q, "repo": repo, "limit": limit, "offset": offset, "results": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,138 @@
+import gc
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+from core.logging_config import logger
+
+# unload models nobody has used for this long; 0 keeps them loaded
+MODEL_IDLE_UNLOAD_SECONDS = float(os.getenv("MODEL_IDLE_UNLOAD_SECONDS", "1800"))
+# load every registered model at startup instead of on first use
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "0") == "1"
+
+class _Entry:
+    def __init__(self, load: Callable[[], Any], unload: Optional[Callable[[], None]]):
+        self.load = load
+        self.unload = unload
+        self.value: Any = None
+        self.state = "unloaded"  # unloaded | loading | loaded | failed
+        self.error: Optional[str] = None
+        self.refs = 0
+        self.last_used = time.monotonic()
+        self.load_seconds: Optional[float] = None
+        self.lock = threading.Lock()  # serializes loading of this model
+
+class ModelRegistry:
+    """Process-wide, lazily loaded models shared by name.
+
+    Engines register a loader under a name that identifies the model
+    configuration; the model is loaded on the first `lease` and shared by every
+    engine registering the same name. Leases are reference counted, and a model
+    without leases is unloaded once it has been idle for `idle_seconds`.
+    """
+
+    def __init__(self, idle_seconds: float = MODEL_IDLE_UNLOAD_SECONDS):
+        self.idle_seconds = idle_seconds
+        self._entries: Dict[str, _Entry] = {}
+        self._guard = threading.Lock()
+        self.warmed_up = False
+        if idle_seconds > 0:
+            threading.Thread(target=self._reap, name="model-reaper", daemon=True).start()
+
+    def register(self, name: str, load: Callable[[], Any], unload: Optional[Callable[[], None]] = None):
+        """Register a loader; the first registration of a name wins."""
+        with self._guard:
+            self._entries.setdefault(name, _Entry(load, unload))
+
+    @contextmanager
+    def lease(self, name: str) -> Iterator[Any]:
+        """Yield the loaded model, loading it first if needed. The model stays loaded while leased."""
+        with self._guard:
+            entry = self._entries[name]
+            entry.refs += 1
+        try:
+            yield self._ensure_loaded(name, entry)
+        finally:
+            with self._guard:
+                entry.refs -= 1
+                entry.last_used = time.monotonic()
+
+    def _ensure_loaded(self, name: str, entry: _Entry) -> Any:
+        with entry.lock:
+            if entry.value is not None:
+                return entry.value
+            entry.state, entry.error = "loading", None
+            logger.info(f"Loading model '{name}'")
+            start = time.monotonic()
+            try:
+                value = entry.load()
+            except Exception as e:
+                entry.state, entry.error = "failed", str(e)
+                logger.exception(f"Failed to load model '{name}': {e}")
+                raise
+            with self._guard:
+                entry.value, entry.state = value, "loaded"
+                entry.load_seconds = time.monotonic() - start
+            logger.info(f"Loaded model '{name}' in {entry.load_seconds:.1f}s")
+            return value
+
+    def warmup(self):
+        """Load every registered model now."""
+        with self._guard:
+            names = list(self._entries)
+        for name in names:
+            with self.lease(name):
+                pass
+        self.warmed_up = True
+
+    def unload_idle(self):
+        now = time.monotonic()
+        unloaded = []
+        with self._guard:
+            for name, entry in self._entries.items():
+                if entry.value is None or entry.refs or now - entry.last_used < self.idle_seconds:
+                    continue
+                unloaded.append((name, entry))
+                entry.value, entry.state = None, "unloaded"
+        if not unloaded:
+            return
+        for name, _ in unloaded:
+            logger.info(f"Unloaded idle model '{name}'")
+        gc.collect()
+        # release hooks run once the last references are gone, e.g. to return cached GPU memory
+        for _, entry in unloaded:
+            if entry.unload:
+                entry.unload()
+
+    def _reap(self):
+        while True:
+            time.sleep(min(self.idle_seconds / 4, 60))
+            try:
+                self.unload_idle()
+            except Exception as e:
+                logger.exception(f"Unloading idle models failed: {e}")
+
+    def status(self) -> Dict[str, dict]:
+        now = time.monotonic()
+        with self._guard:
+            return {
+                name: {
+                    "state": entry.state,
+                    "refs": entry.refs,
+                    "idle_seconds": round(now - entry.last_used, 1),
+                    "load_seconds": entry.load_seconds,
+                    "error": entry.error,
+                }
+                for name, entry in self._entries.items()
+            }
+
+_registry: Optional[ModelRegistry] = None
+_registry_guard = threading.Lock()
+
+def get_model_registry() -> ModelRegistry:
+    global _registry
+    with _registry_guard:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
@@ -2,5 +2,6 @@ from enum import Enum
 
 class JobStatus(str, Enum):
     PENDING = "pending"
+    RUNNING = "running"
     FAILED = "failed"
     COMPLETED = "completed"
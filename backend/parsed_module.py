@@ -0,0 +1,66 @@
+import ast
+from bisect import bisect_right
+from typing import Dict, List, Optional, Type
+
+class ParsedModule:
+    """A source file parsed once and shared by every analysis pass.
+
+    Holds the source, its AST (or the parse error), the offset of each line and
+    every AST node grouped by exact node type, collected in a single walk.
+    """
+
+    def __init__(self, source: str, filename: Optional[str] = None):
+        self.source = source
+        self.filename = filename
+        self.tree: Optional[ast.Module] = None
+        self.error: Optional[Exception] = None
+        self.nodes_by_type: Dict[Type[ast.AST], List[ast.AST]] = {}
+
+        self.line_offsets = [0]
+        newline = source.find("\n")
+        while newline != -1:
+            self.line_offsets.append(newline + 1)
+            newline = source.find("\n", newline + 1)
+
+        try:
+            self.tree = ast.parse(source, filename=filename or "<unknown>")
+        except Exception as e:
+            self.error = e
+            return
+
+        by_type = self.nodes_by_type
+        for node in ast.walk(self.tree):
+            by_type.setdefault(type(node), []).append(node)
+
+    @property
+    def ok(self) -> bool:
+        return self.tree is not None
+
+    @property
+    def body(self) -> List[ast.stmt]:
+        """Top-level statements."""
+        return self.tree.body if self.tree is not None else []
+
+    def nodes(self, *types: Type[ast.AST]) -> List[ast.AST]:
+        """All nodes of the given exact types, grouped by type in the order given."""
+        if len(types) == 1:
+            return self.nodes_by_type.get(types[0], [])
+        result: List[ast.AST] = []
+        for t in types:
+            result.extend(self.nodes_by_type.get(t, []))
+        return result
+
+    def offset(self, lineno: int) -> int:
+        """Character offset of the start of a 1-based line number."""
+        return self.line_offsets[lineno - 1]
+
+    def line_of(self, offset: int) -> int:
+        """1-based line number containing a character offset."""
+        return bisect_right(self.line_offsets, offset)
+
+    def segment(self, node: ast.AST) -> str:
+        """Source text spanned by `node` (whole lines)."""
+        end = getattr(node, "end_lineno", None) or node.lineno
+        start_offset = self.line_offsets[node.lineno - 1]
+        end_offset = self.line_offsets[end] if end < len(self.line_offsets) else len(self.source)
+        return self.source[start_offset:end_offset]
@@ -1,54 +1,155 @@
+import os
 import sqlite3
-from sentence_transformers import SentenceTransformer, util
+import threading
+import numpy as np
+from typing import Dict
+from model_registry import get_model_registry
+from core.metrics import timed
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_DTYPE = np.float32
+BACKFILL_BATCH_SIZE = 256
+
+def _load_embedding_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL)
 
 class PersonalizationStore:
     def __init__(self, db_path="personal.db"):
         self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.conn.execute("CREATE TABLE IF NOT EXISTS examples (code TEXT, feedback TEXT)")
-        #self.create_table()
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-
-    # def create_table(self):
-    #     with self.conn:
-    #         self.conn.execute('''
-    #             CREATE TABLE IF NOT EXISTS examples (
-    #                 id INTEGER PRIMARY KEY,
-    #                 code TEXT,
-    #                 feedback TEXT,
-    #                 embedding BLOB
-    #             )
-    #         ''')
+        self.lock = threading.Lock()
+        self.create_table()
+        # the embedding model is loaded on first use and shared through the model registry
+        self.models = get_model_registry()
+        self.model_key = f"embedding:{EMBEDDING_MODEL}"
+        self.models.register(self.model_key, _load_embedding_model)
+        self.dim = None
+
+        # In-memory index: row i of the matrix is the normalized embedding of examples.rowid == ids[i]
+        self._matrix = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._size = 0
+        self._last_id = 0
+
+    def _ensure_index(self):
+        # caller holds self.lock; first use loads the model, embeds old rows and builds the matrix
+        if self._matrix is not None:
+            return
+        with self.models.lease(self.model_key) as model:
+            self.dim = model.get_sentence_embedding_dimension()
+        self.backfill_embeddings()
+        self._matrix = np.empty((0, self.dim), dtype=EMBEDDING_DTYPE)
+        self._load_new_rows()
+
+    def create_table(self):
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS examples (code TEXT, feedback TEXT, embedding BLOB)")
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(examples)")]
+            if "embedding" not in columns:
+                # databases created before embeddings were persisted
+                self.conn.execute("ALTER TABLE examples ADD COLUMN embedding BLOB")
+
+    def _encode(self, texts):
+        with self.models.lease(self.model_key) as model, timed("embed"):
+            embeddings = model.encode(texts, normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(embeddings, dtype=EMBEDDING_DTYPE)
+
+    def backfill_embeddings(self):
+        """Compute and store embeddings for rows that were inserted without one."""
+        while True:
+            rows = self.conn.execute(
+                "SELECT rowid, code FROM examples WHERE embedding IS NULL LIMIT ?", (BACKFILL_BATCH_SIZE,)
+            ).fetchall()
+            if not rows:
+                return
+            ids, codes = zip(*rows)
+            embeddings = self._encode(list(codes))
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE examples SET embedding=? WHERE rowid=?",
+                    [(emb.tobytes(), row_id) for emb, row_id in zip(embeddings, ids)]
+                )
+
+    def _append(self, ids: np.ndarray, embeddings: np.ndarray):
+        # caller holds self.lock; grow geometrically so appends are amortized O(1)
+        needed = self._size + len(ids)
+        if needed > self._matrix.shape[0]:
+            capacity = max(needed, 2 * self._matrix.shape[0], 64)
+            matrix = np.empty((capacity, self.dim), dtype=EMBEDDING_DTYPE)
+            matrix[:self._size] = self._matrix[:self._size]
+            row_ids = np.empty(capacity, dtype=np.int64)
+            row_ids[:self._size] = self._ids[:self._size]
+            self._matrix, self._ids = matrix, row_ids
+        self._matrix[self._size:needed] = embeddings
+        self._ids[self._size:needed] = ids
+        self._size = needed
+        self._last_id = max(self._last_id, int(ids.max()))
+
+    def _load_new_rows(self):
+        # caller holds self.lock; picks up rows added since the last load, including other processes
+        rows = self.conn.execute(
+            "SELECT rowid, embedding FROM examples WHERE rowid > ? AND embedding IS NOT NULL ORDER BY rowid",
+            (self._last_id,)
+        ).fetchall()
+        if not rows:
+            return
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        embeddings = np.frombuffer(b"".join(r[1] for r in rows), dtype=EMBEDDING_DTYPE).reshape(len(rows), self.dim)
+        self._append(ids, embeddings)
 
     def add_example(self, code: str, feedback: str):
-        self.conn.execute("INSERT INTO examples (code, feedback) VALUES (?,?)", (code, feedback))
-        self.conn.commit()
-        # embedding = self.model.encode(code)
-        # with self.conn:
-        #     self.conn.execute('''
-        #         INSERT INTO examples (code, feedback, embedding) VALUES (?, ?, ?)
-        #     ''', (code, feedback, embedding.tobytes()))
+        embedding = self._encode([code])[0]
+        with self.lock:
+            self._ensure_index()
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO examples (code, feedback, embedding) VALUES (?,?,?)",
+                    (code, feedback, embedding.tobytes())
+                )
+            self._load_new_rows()
+
+    def corpus_version(self) -> str:
+        """Changes whenever examples are added or removed."""
+        with self.lock:  # the connection is shared with add_example and get_examples
+            count, last_id = self.conn.execute("SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM examples").fetchone()
+        return f"{count}:{last_id}"
 
     def get_examples(self, code: str, k: int =3):
-        cursor = self.conn.execute("SELECT code, feedback FROM examples")
-        rows = cursor.fetchall()
-        if not rows:
-            return []
-
-        codes, feedbacks = zip(*rows)
-        embeddings = self.model.encode(list(codes), convert_to_tensor=True)
-        query_emb = self.model.encode(code, convert_to_tensor=True)
-        scores = util.cos_sim(query_emb, embeddings)[0]
-        topk = scores.topk(k)
-        result = [(codes[i], feedbacks[i]) for i in topk.indices.tolist()]
-        return result
-        # query_embedding = self.model.encode(code)
-        # cursor = self.conn.cursor()
-        # cursor.execute('SELECT id, code, feedback, embedding FROM examples')
-        # examples = []
-        # for row in cursor.fetchall():
-        #     ex_id, ex_code, ex_feedback, ex_embedding_blob = row
-        #     ex_embedding = np.frombuffer(ex_embedding_blob, dtype=np.float32)
-        #     sim = util.cos_sim(query_embedding, ex_embedding).item()
-        #     examples.append((sim, ex_code, ex_feedback))
-        # examples.sort(reverse=True, key=lambda x: x[0])
-        # return [(ex_code, ex_feedback) for _, ex_code, ex_feedback in examples[:k]]
\ No newline at end of file
+        with timed("retrieval"):
+            return self._get_examples(code, k)
+
+    def _get_examples(self, code: str, k: int):
+        with self.lock:
+            if self._matrix is None and self.conn.execute("SELECT 1 FROM examples LIMIT 1").fetchone() is None:
+                return []  # building the index loads the model; without examples it is not needed
+            self._ensure_index()
+            self._load_new_rows()
+            if self._size == 0:
+                return []
+        query = self._encode([code])[0]
+        with self.lock:
+            # embeddings are normalized, so the dot product is the cosine similarity
+            scores = self._matrix[:self._size] @ query
+            k = min(k, self._size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            top_ids = [int(i) for i in self._ids[top]]
+
+            placeholders = ",".join("?" * len(top_ids))
+            rows = dict(
+                (row[0], (row[1], row[2])) for row in self.conn.execute(
+                    f"SELECT rowid, code, feedback FROM examples WHERE rowid IN ({placeholders})", top_ids
+                )
+            )
+        return [rows[i] for i in top_ids if i in rows]
+
+_stores: Dict[str, PersonalizationStore] = {}
+_stores_guard = threading.Lock()
+
+def get_personalization_store(db_path: str = "personal.db") -> PersonalizationStore:
+    """Shared store per database file, so engines do not each keep a copy of the index."""
+    key = os.path.abspath(db_path)
+    with _stores_guard:
+        if key not in _stores:
+            _stores[key] = PersonalizationStore(db_path)
+        return _stores[key]
@@ -0,0 +1,277 @@
+import os
+import time
+import asyncio
+from typing import Dict, Iterable, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from db import ReviewDB, ReviewCache
+from schemas import FileReview, ReviewRequest, FinalReview, RepoArchitecture, ReviewOutput
+from models.job_status import JobStatus
+from prepare_files import prepare_files, prepare_git_files, carry_forward_reviews, iter_zip_files
+from static_analysis import get_analysis_pool
+from security_rules import enabled_rule_sets
+from security_batching import BanditBatcher
+from review_engines.base import BaseReviewEngine
+from review_engines.python_engine import PythonReviewEngine
+from streaming import JobEventBroker
+from repo_graph import RepoGraph, summarize_module, summary_key
+from job_queue import BULK, job_lane
+from core.logging_config import logger
+from core.sqlite import log_write_errors
+from core.metrics import EXECUTOR_THREADS, current_job_timings, executor_task, record_stage, timed
+
+# Engine registry
+engines: Dict[str, BaseReviewEngine] = {
+    "py": PythonReviewEngine(use_gpu=True),
+    # "cs": CSharpReviewEngine(use_gpu=True),  # Future extension
+}
+
+db = ReviewDB("reviews.db")
+review_cache = ReviewCache("reviews.db")
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", "4"))
+# files reviewed at once across all jobs, and at most this many per job
+MAX_CONCURRENT_FILES = int(os.getenv("MAX_CONCURRENT_FILES", str(EXECUTOR_WORKERS)))
+JOB_FILE_CONCURRENCY = int(os.getenv("JOB_FILE_CONCURRENCY", "4"))
+
+executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS)
+EXECUTOR_THREADS.set(EXECUTOR_WORKERS, ("review",))
+# FIFO semaphore: each job queues at most JOB_FILE_CONCURRENCY waiters, so jobs take turns for slots
+file_slots = asyncio.Semaphore(MAX_CONCURRENT_FILES)
+bandit_batcher = BanditBatcher(lambda: get_analysis_pool() or executor)
+# jobs currently being processed by this process
+jobs: Dict[str, FinalReview] = {}
+events = JobEventBroker()
+
+def get_engine(filename: str) -> BaseReviewEngine:
+    """Return the correct engine based on file extension. Defaults to Python."""
+    if not filename:
+        return engines["py"]
+    ext = os.path.splitext(filename)[1].lstrip('.').lower()
+    return engines.get(ext, engines["py"])
+
+def review_configs(files: List[FileReview], repo: str) -> Dict[str, str]:
+    """{repo path: config key of the engine that reviews the file}."""
+    rule_sets = tuple(sorted(enabled_rule_sets(repo)))
+    by_engine: Dict[int, str] = {}
+    configs = {}
+    for f in files:
+        engine = get_engine(f.filename)
+        if id(engine) not in by_engine:
+            by_engine[id(engine)] = engine.config_key(rule_sets)
+        configs[f.repo_path] = by_engine[id(engine)]
+    return configs
+
+def prepare_job_files(request: ReviewRequest) -> Tuple[Iterable[FileReview], Optional[Tuple[str, str, Dict[str, str]]]]:
+    """Files to review for a queued request, and for git sources the snapshot to record.
+
+    The snapshot is (repo key, commit, review config per repo path).
+    """
+    local_source = request.code or request.uploaded_file_path or (request.filename and os.path.exists(request.filename))
+    if request.git_url and not local_source:
+        # only review files that changed since the last review of this repository
+        commit_sha, files = prepare_git_files(request.git_url, request.git_ref)
+        snapshot_key = f"{request.git_url}#{request.git_ref}" if request.git_ref else request.git_url
+        last_commit, previous = db.get_repo_snapshot(snapshot_key)
+        configs = review_configs(files, request.repo or "local")
+        reused = carry_forward_reviews(files, previous, configs)
+        logger.info(f"Repo '{snapshot_key}' at {commit_sha} (last reviewed {last_commit}): "
+                    f"{reused} of {len(files)} file(s) unchanged")
+        return files, (snapshot_key, commit_sha, configs)
+
+    if request.uploaded_file_path and not os.path.exists(request.uploaded_file_path):
+        # uploads live in the API host's UPLOAD_DIR; not retried, another attempt would not find it either
+        raise FileNotFoundError(f"Upload '{request.uploaded_file_path}' not found; workers must run on the API's host")
+    if request.uploaded_file_path and os.path.splitext(request.uploaded_file_path)[1].lower() == ".zip":
+        # members are read lazily as the job's workers pull them
+        return iter_zip_files(request.uploaded_file_path), None
+
+    return prepare_files(request), None
+
+def lookup_review(engine: BaseReviewEngine, code: str, rule_sets: Tuple[str, ...]) -> Tuple[str, Optional[ReviewOutput]]:
+    """Cache key of a review and the cached review, if any. Both query SQLite, so this runs off the event loop."""
+    cache_key = engine.cache_key(code, rule_sets)
+    return cache_key, review_cache.get(cache_key)
+
+async def timed_step(stage: str, awaitable):
+    with timed(stage):
+        return await awaitable
+
+async def process_file(file_review: FileReview, repo: str = None, job_id: str = None) -> FileReview:
+    start = time.perf_counter()
+    try:
+        logger.info(f"Processing file: {file_review.filename}")
+
+        """Process a single FileReview object and store result in DB."""
+        loop = asyncio.get_running_loop()
+        engine = get_engine(file_review.filename)
+
+        on_token = None
+        if job_id and events.has_subscribers(job_id):
+            def on_token(text: str):
+                events.publish(job_id, "token", {"filename": file_review.filename, "text": text})
+
+        rule_sets = tuple(sorted(enabled_rule_sets(repo)))
+        cache_key, result = await loop.run_in_executor(
+            None, executor_task("default", lookup_review, engine, file_review.code, rule_sets)
+        )
+        if result is not None:
+            logger.info(f"Review cache hit for file: {file_review.filename}")
+            # architecture metrics are labelled with the filename, which is not part of the key
+            for metric in result.architecture:
+                metric.name = file_review.filename or "code"
+        else:
+            logger.info("Analyzing code and generating feedback...")
+            # CPU-bound static analysis runs in worker processes, the LLM stays on the thread pool;
+            # bandit runs separately, batched with the files being processed alongside this one
+            analysis = timed_step("static_analysis", loop.run_in_executor(
+                get_analysis_pool() or executor, engine.static_analyzer,
+                file_review.code, file_review.filename, tuple(s for s in rule_sets if s != "bandit")
+            ))
+            feedback = timed_step("feedback", loop.run_in_executor(
+                executor, executor_task("review", engine.generate_feedback, file_review.code, on_token=on_token)
+            ))
+            steps = [analysis, feedback]
+            if "bandit" in rule_sets:
+                steps.append(timed_step("bandit", bandit_batcher.scan(file_review.code)))
+            (arch, sec), feedback, *bandit = await asyncio.gather(*steps)
+            if bandit:
+                sec = bandit[0] + list(sec)
+            result = engine.assemble_review(feedback, arch, sec)
+            stored = review_cache.put(cache_key, result)
+            if stored is not None:
+                log_write_errors(stored, f"cache the review of '{file_review.filename}'")
+
+        log_write_errors(db.insert_review(
+            repo=repo or "local",
+            filepath=file_review.filename or "<stdin>",
+            review_text=result.final_feedback,
+            security_findings=result.security_findings
+        ), f"store the review of '{file_review.filename}'")
+
+        file_review.review = result  # attach ReviewOutput
+        return file_review
+
+    except Exception as e:
+        logger.exception(f"Exception while processing file for filename:'{file_review.filename}'.\n {e}")
+        raise
+    finally:
+        record_stage("process_file", time.perf_counter() - start)
+
+async def summarize_file(file_review: FileReview, repo_graph: RepoGraph):
+    """Add a file's import summary to the job's module graph, parsing it only if its content is new."""
+    path = file_review.repo_path or file_review.filename
+    if not path or not path.endswith(".py") or not file_review.code:
+        return
+    key = summary_key(file_review.code)
+    summary = db.get_module_summary(key)
+    if summary is None:
+        loop = asyncio.get_running_loop()
+        summary = await timed_step("summarize", loop.run_in_executor(
+            get_analysis_pool() or executor, summarize_module, file_review.code
+        ))
+        log_write_errors(db.save_module_summary(key, summary), f"store the module summary of '{path}'")
+    repo_graph.add(path, summary)
+
+async def process_job(job_id: str, files: Iterable[FileReview], repo: str = None,
+                      repo_graph: Optional[RepoGraph] = None) -> List[FileReview]:
+    """Process multiple files for a job concurrently.
+
+    `files` may be a lazy iterator; it is consumed as slots free up. Files that
+    already carry a review (unchanged since the last review of their repository)
+    are passed through. Each file is also summarized into `repo_graph` when one
+    is given. Raises if no file could be reviewed.
+    """
+    results: Dict[int, FileReview] = {}
+    total = len(files) if hasattr(files, "__len__") else None
+    pending = enumerate(files)  # shared by the job's workers, each file is taken once
+    loop = asyncio.get_running_loop()
+    fetch_lock = asyncio.Lock()
+
+    async def next_file() -> Optional[Tuple[int, FileReview]]:
+        if total is not None:
+            return next(pending, None)
+        # lazy sources inflate and decode each member on next(): keep that off the event loop,
+        # one fetch at a time as a generator cannot run in two threads at once
+        async with fetch_lock:
+            return await loop.run_in_executor(None, next, pending, None)
+
+    async def worker():
+        while True:
+            item = await next_file()
+            if item is None:
+                return
+            index, file_review = item
+            if repo_graph is not None:
+                try:
+                    await summarize_file(file_review, repo_graph)
+                except Exception as e:
+                    logger.warning(f"Could not summarize '{file_review.filename}' for the module graph: {e}")
+            if file_review.review is not None:
+                results[index] = file_review
+                continue
+            async with file_slots:
+                events.publish(job_id, "file_started", {"index": index, "total": total, "filename": file_review.filename})
+                try:
+                    processed = await process_file(file_review, repo, job_id=job_id)
+                except Exception as e:
+                    file_review.error = str(e)
+                    processed = file_review
+            results[index] = processed
+            timings, job = current_job_timings.get(), jobs.get(job_id)
+            if timings is not None and job is not None:
+                job.timings = timings.snapshot()
+            events.publish(job_id, "file_completed", {
+                "index": index,
+                "total": total,
+                "filename": processed.filename,
+                "review": processed.review.model_dump() if processed.review else None,
+                "error": processed.error
+            })
+
+    n_workers = JOB_FILE_CONCURRENCY if total is None else max(1, min(JOB_FILE_CONCURRENCY, total))
+    await asyncio.gather(*(worker() for _ in range(n_workers)))
+    processed_files = [results[i] for i in sorted(results)]
+
+    if not processed_files:
+        raise ValueError("No valid code files found to review")
+    if all(f.error for f in processed_files):
+        raise RuntimeError(processed_files[0].error)
+    return processed_files
+
+async def run_job(job_id: str, payload: dict) -> Tuple[List[FileReview], Optional[RepoArchitecture]]:
+    """Run a queued job in this process: prepare its files, review them and record the repo snapshot.
+
+    Repository and archive jobs with more than one Python module also get a repository-wide module graph.
+    """
+    request = ReviewRequest(**payload["request"])
+    job = jobs.setdefault(job_id, FinalReview(job_id=job_id, status=JobStatus.RUNNING))
+    job.status = JobStatus.RUNNING
+
+    start = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        files, snapshot = await timed_step("prepare_files", loop.run_in_executor(
+            None, executor_task("default", prepare_job_files, request)
+        ))
+        # a snippet or single file cannot make a module graph, so it is not summarized at all
+        repo_graph = RepoGraph() if job_lane(request) == BULK else None
+        processed_files = await process_job(job_id, files, request.repo or "local", repo_graph=repo_graph)
+        architecture = None
+        if repo_graph is not None and len(repo_graph) > 1:
+            architecture = await timed_step("repo_graph", loop.run_in_executor(
+                executor, executor_task("review", repo_graph.build)
+            ))
+            job.architecture = architecture
+
+        if snapshot:
+            repo_key, commit_sha, configs = snapshot
+            log_write_errors(db.save_repo_snapshot(repo_key, commit_sha, processed_files, configs),
+                             f"record the snapshot of '{repo_key}' at {commit_sha}")
+        job.result = processed_files
+        logger.info(f"Completed job processing for job_id: '{job_id}'")
+        return processed_files, architecture
+    finally:
+        record_stage("job", time.perf_counter() - start)
+        timings = current_job_timings.get()
+        if timings is not None:
+            job.timings = timings.snapshot()
+
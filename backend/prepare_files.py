@@ -1,7 +1,47 @@
 import os
-from typing import List
-from schemas import ReviewRequest, FileReview
-from utils import clone_git_repo, enumerate_source_files, extract_zip
+from typing import Dict, Iterator, List, Optional, Tuple
+from schemas import ReviewRequest, FileReview, ReviewOutput
+from utils import git_tree_blobs, iter_zip_sources
+from repo_cache import get_repo_cache
+from core.logging_config import logger
+
+def iter_zip_files(zip_path: str) -> Iterator[FileReview]:
+    """Lazily yield reviewable files straight from a zip archive."""
+    for name, data in iter_zip_sources(zip_path, extensions=["py"]):
+        try:
+            code = data.decode('utf-8')
+        except UnicodeDecodeError:
+            logger.warning(f"Skipping non UTF-8 archive member: {name}")
+            continue
+        yield FileReview(code=code, filename=name)
+
+def prepare_git_files(git_url: str, ref: Optional[str] = None) -> Tuple[str, List[FileReview]]:
+    """Check out `ref` of `git_url` from the mirror cache and return its commit sha with the source files."""
+    files: List[FileReview] = []
+    with get_repo_cache().checkout(git_url, ref) as worktree:
+        commit_sha, blobs = git_tree_blobs(worktree, extensions=["py"])
+        for rel_path, blob_sha in blobs.items():
+            with open(os.path.join(worktree, rel_path), 'r', encoding='utf-8') as f:
+                files.append(FileReview(code=f.read(), filename=rel_path, repo_path=rel_path, blob_sha=blob_sha))
+    return commit_sha, files
+
+def carry_forward_reviews(files: List[FileReview], previous: Dict[str, Tuple[str, Optional[str], ReviewOutput]],
+                          review_configs: Dict[str, str]) -> int:
+    """Attach stored reviews to files whose blob is unchanged since the last review. Returns the count.
+
+    A stored review is only reused if it was made with the file's current
+    engine configuration (model, prompt, engine version, examples, rule sets).
+    """
+    reused = 0
+    for f in files:
+        stored = previous.get(f.repo_path)
+        if stored and stored[0] == f.blob_sha and stored[1] == review_configs.get(f.repo_path):
+            review = stored[2]
+            for metric in review.architecture:
+                metric.name = f.filename or "code"
+            f.review = review
+            reused += 1
+    return reused
 
 def prepare_files(input: ReviewRequest) -> List[FileReview]:
     files: List[FileReview] = []
@@ -22,11 +62,7 @@ def prepare_files(input: ReviewRequest) -> List[FileReview]:
     if input.uploaded_file_path and os.path.exists(input.uploaded_file_path):
         ext = os.path.splitext(input.uploaded_file_path)[1].lower()
         if ext == ".zip":
-            temp_dir = extract_zip(input.uploaded_file_path)
-            paths = enumerate_source_files(temp_dir, extensions=["py"])
-            for p in paths:
-                with open(p, 'r', encoding='utf-8') as f:
-                    files.append(FileReview(code=f.read(), filename=p))
+            files.extend(iter_zip_files(input.uploaded_file_path))
         else:
             with open(input.uploaded_file_path, 'r', encoding='utf-8') as f:
                 files.append(FileReview(code=f.read(), filename=input.uploaded_file_path))
@@ -34,11 +70,7 @@ def prepare_files(input: ReviewRequest) -> List[FileReview]:
 
     # GitHub repo
     if input.git_url:
-        temp_dir = clone_git_repo(input.git_url, clone_to=None)
-        paths = enumerate_source_files(temp_dir, extensions=["py"])
-        for p in paths:
-            with open(p, 'r', encoding='utf-8') as f:
-                files.append(FileReview(code=f.read(), filename=p))
+        _, files = prepare_git_files(input.git_url, input.git_ref)
         return files
 
     return files
\ No newline at end of file
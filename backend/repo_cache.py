@@ -0,0 +1,164 @@
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from git import Repo
+from core.logging_config import logger
+from core.metrics import timed
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: in-process locking only
+    fcntl = None
+
+REPO_CACHE_DIR = os.getenv("REPO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "codelens-repos"))
+REPO_CACHE_MAX_BYTES = int(os.getenv("REPO_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+# worktrees older than this were left behind by a crashed process
+STALE_WORKTREE_SECONDS = 3600
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, filenames in os.walk(path):
+        for fname in filenames:
+            try:
+                total += os.lstat(os.path.join(root, fname)).st_size
+            except OSError:
+                pass
+    return total
+
+class RepoMirrorCache:
+    """Bare mirrors of remote repositories, reused across reviews.
+
+    The first review of a URL clones a bare mirror; later reviews only fetch.
+    Each review gets a detached worktree of the requested ref, which is removed
+    when the review's files have been read. Mirrors are evicted least recently
+    used first once the cache grows past `max_bytes`.
+    """
+
+    def __init__(self, root: str = REPO_CACHE_DIR, max_bytes: int = REPO_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.mirrors_dir = os.path.join(root, "mirrors")
+        self.worktrees_dir = os.path.join(root, "worktrees")
+        os.makedirs(self.mirrors_dir, exist_ok=True)
+        os.makedirs(self.worktrees_dir, exist_ok=True)
+
+        self._guard = threading.Lock()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._in_use: Dict[str, int] = {}
+        self._sizes: Dict[str, int] = {}
+        self._remove_stale_worktrees()
+
+    def mirror_path(self, git_url: str) -> str:
+        key = hashlib.sha256(git_url.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.mirrors_dir, f"{key}.git")
+
+    @contextmanager
+    def _lock(self, mirror: str) -> Iterator[None]:
+        """Serialize clone/fetch/worktree operations on one mirror, across threads and processes."""
+        with self._guard:
+            lock = self._locks.setdefault(mirror, threading.Lock())
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            with open(mirror + ".lock", "w") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _update(self, git_url: str, mirror: str):
+        # caller holds the mirror lock
+        if os.path.isdir(mirror):
+            repo = Repo(mirror)
+            repo.git.fetch("--prune", "origin")
+            repo.git.worktree("prune")
+        else:
+            logger.info(f"Creating mirror for '{git_url}'")
+            tmp = mirror + ".partial"
+            shutil.rmtree(tmp, ignore_errors=True)
+            Repo.clone_from(git_url, tmp, mirror=True)
+            os.replace(tmp, mirror)
+        os.utime(mirror)
+        self._sizes[mirror] = _dir_size(mirror)
+
+    @contextmanager
+    def checkout(self, git_url: str, ref: Optional[str] = None) -> Iterator[str]:
+        """Yield a directory holding a detached checkout of `ref` (default branch if None)."""
+        mirror = self.mirror_path(git_url)
+        with self._guard:
+            self._in_use[mirror] = self._in_use.get(mirror, 0) + 1
+        worktree = None
+        try:
+            with self._lock(mirror):
+                with timed("git_fetch"):
+                    self._update(git_url, mirror)
+                worktree = tempfile.mkdtemp(dir=self.worktrees_dir)
+                with timed("git_checkout"):
+                    Repo(mirror).git.worktree("add", "--detach", "--force", worktree, ref or "HEAD")
+            yield worktree
+        finally:
+            if worktree:
+                with self._lock(mirror):
+                    try:
+                        Repo(mirror).git.worktree("remove", "--force", worktree)
+                    except Exception as e:
+                        logger.warning(f"Failed to remove worktree {worktree}: {e}")
+                    shutil.rmtree(worktree, ignore_errors=True)
+            with self._guard:
+                self._in_use[mirror] -= 1
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used mirrors that are not in use until within max_bytes."""
+        with self._guard:
+            mirrors = [
+                os.path.join(self.mirrors_dir, name)
+                for name in os.listdir(self.mirrors_dir) if name.endswith(".git")
+            ]
+            for mirror in mirrors:
+                if mirror not in self._sizes:
+                    self._sizes[mirror] = _dir_size(mirror)
+            total = sum(self._sizes[m] for m in mirrors)
+            if total <= self.max_bytes:
+                return
+            candidates = sorted(
+                (m for m in mirrors if not self._in_use.get(m)), key=lambda m: os.stat(m).st_mtime
+            )
+
+        for mirror in candidates:
+            if total <= self.max_bytes:
+                break
+            with self._lock(mirror):
+                with self._guard:
+                    if self._in_use.get(mirror):
+                        continue
+                logger.info(f"Evicting repository mirror {mirror}")
+                shutil.rmtree(mirror, ignore_errors=True)
+                total -= self._sizes.pop(mirror, 0)
+
+    def _remove_stale_worktrees(self):
+        cutoff = time.time() - STALE_WORKTREE_SECONDS
+        for name in os.listdir(self.worktrees_dir):
+            path = os.path.join(self.worktrees_dir, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+
+_cache: Optional[RepoMirrorCache] = None
+_cache_guard = threading.Lock()
+
+def get_repo_cache() -> RepoMirrorCache:
+    global _cache
+    with _cache_guard:
+        if _cache is None:
+            _cache = RepoMirrorCache()
+        return _cache
@@ -0,0 +1,194 @@
+import os
+import ast
+import hashlib
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from analyzer import get_call_name
+from graph import CodeGraph
+from parsed_module import ParsedModule
+from schemas import ModuleRank, RepoArchitecture
+
+# Bump when summarize_module output changes; cached summaries are keyed with it
+SUMMARY_VERSION = "1"
+REPO_GRAPH_TOP_N = int(os.getenv("REPO_GRAPH_TOP_N", "10"))
+# larger repositories get the JSON graph only
+REPO_GRAPH_MAX_DOT_MODULES = int(os.getenv("REPO_GRAPH_MAX_DOT_MODULES", "300"))
+
+DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+def summary_key(code: str) -> str:
+    return hashlib.sha256(f"{SUMMARY_VERSION}\0{code}".encode("utf-8")).hexdigest()
+
+def summarize_module(code: str) -> dict:
+    """Imports, top-level definitions and call names of one file.
+
+    Depends only on the source, so it can be cached by content hash; relative
+    imports are kept unresolved (level, module, names) until the file's path is known.
+    """
+    module = ParsedModule(code)
+    if not module.ok:
+        return {"imports": [], "definitions": [], "calls": [], "error": str(module.error)}
+    imports = []
+    for node in module.nodes(ast.Import, ast.ImportFrom):
+        if isinstance(node, ast.Import):
+            imports.extend([0, alias.name, []] for alias in node.names)
+        else:
+            imports.append([node.level or 0, node.module or "", [alias.name for alias in node.names]])
+    return {
+        "imports": imports,
+        "definitions": [node.name for node in module.body if isinstance(node, DEFINITIONS)],
+        "calls": sorted({name for name in map(get_call_name, module.nodes(ast.Call)) if name}),
+    }
+
+def module_name(path: str) -> Optional[str]:
+    """Dotted module name of a repository path: pkg/sub/mod.py -> pkg.sub.mod, pkg/__init__.py -> pkg."""
+    path = path.replace("\\", "/")
+    if not path.endswith(".py"):
+        return None
+    parts = [p for p in path[:-3].split("/") if p and p != "."]
+    if parts and parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(parts) or None
+
+def _strongly_connected(adjacency: Dict[str, List[str]]) -> Iterator[List[str]]:
+    """Tarjan's algorithm without recursion, O(modules + imports)."""
+    index: Dict[str, int] = {}
+    low: Dict[str, int] = {}
+    stack: List[str] = []
+    on_stack: Set[str] = set()
+    for root in adjacency:
+        if root in index:
+            continue
+        work = [(root, iter(adjacency[root]))]
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, targets = work[-1]
+            advanced = False
+            for target in targets:
+                if target not in index:
+                    index[target] = low[target] = len(index)
+                    stack.append(target)
+                    on_stack.add(target)
+                    work.append((target, iter(adjacency[target])))
+                    advanced = True
+                    break
+                if target in on_stack:
+                    low[node] = min(low[node], index[target])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                yield component
+
+class RepoGraph:
+    """Module import graph of one job, assembled from per-file summaries.
+
+    Imports resolve to the job's own modules by exact dotted name, or by
+    dotted suffix for layouts where the import root is below the repository
+    root (src/pkg/mod.py imported as pkg.mod). Everything else counts as an
+    external package.
+    """
+
+    def __init__(self):
+        self.paths: Dict[str, str] = {}
+        self.summaries: Dict[str, dict] = {}
+
+    def add(self, path: str, summary: dict):
+        name = module_name(path)
+        if name:
+            self.paths[name] = path
+            self.summaries[name] = summary
+
+    def __len__(self) -> int:
+        return len(self.summaries)
+
+    def _suffix_index(self) -> Dict[str, str]:
+        index: Dict[str, str] = {}
+        for name in sorted(self.paths, key=lambda n: (n.count("."), n)):
+            parts = name.split(".")
+            for i in range(1, len(parts)):
+                index.setdefault(".".join(parts[i:]), name)  # shallowest module wins
+        return index
+
+    def _resolve(self, dotted: str, suffixes: Dict[str, str]) -> Optional[str]:
+        """The job module `dotted` (or its closest enclosing package) refers to."""
+        parts = dotted.split(".")
+        for i in range(len(parts), 0, -1):
+            prefix = ".".join(parts[:i])
+            found = prefix if prefix in self.paths else suffixes.get(prefix)
+            if found:
+                return found
+        return None
+
+    def _targets(self, name: str, summary: dict) -> Iterator[Tuple[str, bool]]:
+        """(dotted name, relative) of everything a module imports."""
+        is_package = self.paths[name].replace("\\", "/").endswith("__init__.py")
+        package = name.split(".") if is_package else name.split(".")[:-1]
+        for level, module, names in summary["imports"]:
+            if level:
+                base = package[:len(package) - (level - 1)] if level - 1 <= len(package) else []
+                module = ".".join(base + ([module] if module else []))
+            if names:
+                for imported in names:
+                    yield (f"{module}.{imported}" if module else imported), bool(level)
+            elif module:
+                yield module, bool(level)
+
+    def build(self) -> RepoArchitecture:
+        suffixes = self._suffix_index()
+        adjacency: Dict[str, List[str]] = {name: [] for name in self.summaries}
+        external: Dict[str, Set[str]] = {}
+        for name, summary in self.summaries.items():
+            seen = set()
+            for target, relative in self._targets(name, summary):
+                resolved = self._resolve(target, suffixes)
+                if resolved is None:
+                    if not relative and target:
+                        external.setdefault(target.split(".")[0], set()).add(name)
+                elif resolved != name and resolved not in seen:
+                    seen.add(resolved)
+                    adjacency[name].append(resolved)
+
+        fan_in: Dict[str, int] = dict.fromkeys(adjacency, 0)
+        for targets in adjacency.values():
+            for target in targets:
+                fan_in[target] += 1
+        cycles = sorted(
+            (sorted(c) for c in _strongly_connected(adjacency) if len(c) > 1),
+            key=lambda c: (-len(c), c)
+        )
+
+        def top(counts: Dict[str, int]) -> List[ModuleRank]:
+            ranked = sorted((item for item in counts.items() if item[1]), key=lambda item: (-item[1], item[0]))
+            return [ModuleRank(module=m, path=self.paths[m], count=c) for m, c in ranked[:REPO_GRAPH_TOP_N]]
+
+        G = CodeGraph()
+        for name in adjacency:
+            G.add_node(name, type="module", label=self.paths[name])
+        for name, targets in adjacency.items():
+            for target in targets:
+                G.add_edge(name, target, relation="imports")
+
+        return RepoArchitecture(
+            module_count=len(adjacency),
+            edge_count=sum(len(t) for t in adjacency.values()),
+            cycles=cycles,
+            fan_in=top(fan_in),
+            fan_out=top({name: len(targets) for name, targets in adjacency.items()}),
+            external_imports=dict(sorted(
+                ((pkg, len(users)) for pkg, users in external.items()), key=lambda item: (-item[1], item[0])
+            )[:REPO_GRAPH_TOP_N]),
+            graph=G.to_json(),
+            dot_diagram=G.to_dot() if len(adjacency) <= REPO_GRAPH_MAX_DOT_MODULES else None
+        )
@@ -1,53 +1,342 @@
 from abc import ABC, abstractmethod
 from pathlib import Path
 from dotenv import load_dotenv
+import hashlib
 import os
+import time
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-from personalization import PersonalizationStore
-from schemas import ReviewOutput
+from typing import Callable, List, Optional, Sequence, Tuple, Union
+from transformers import AutoTokenizer, TextStreamer
+from model_registry import get_model_registry
+from personalization import get_personalization_store
+from review_engines.batching import BatchScheduler
+from review_engines.chunking import CodeChunk, chunk_source, truncate_lines
+from review_engines.inference import LLM_INFERENCE_MODE, load_causal_lm, resolve_inference_mode
+from review_engines.prefix_cache import PrefixKVCache
+from schemas import ReviewOutput, ArchitectureMetric, SecurityFinding
+from core.metrics import Counter, Histogram, record_stage, timed
+from core.logging_config import logger
 
 env_path = Path('.', '.env')
 load_dotenv(env_path)
 HUGGINGFACE_TOKEN = os.environ.get("HUGGINGFACE_TOKEN")
+LLM_MAX_BATCH_SIZE = int(os.getenv("LLM_MAX_BATCH_SIZE", "8"))
+LLM_MAX_WAIT_MS = float(os.getenv("LLM_MAX_WAIT_MS", "10"))
+# prompt tokens per generate call (header, few-shot examples and code), code tokens per chunk,
+# and feedback tokens generated per chunk
+LLM_MAX_PROMPT_TOKENS = int(os.getenv("LLM_MAX_PROMPT_TOKENS", "1536"))
+LLM_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", "768"))
+LLM_MAX_NEW_TOKENS = int(os.getenv("LLM_MAX_NEW_TOKENS", "128"))
+
+PROMPT_HEADER = "You are a senior {language} software engineer. Provide concise, actionable review feedback."
+PROMPT_EXAMPLE = "\nExample Code:\n{code}\nExample Feedback:\n{feedback}\n"
+PROMPT_REVIEW = "\nReview this code:\n{code}\nFeedback:\n"
+CHUNK_FEEDBACK = "Lines {start}-{end}:\n{feedback}"
+
+LLM_TOKENS = Counter("codelens_llm_tokens_generated_total", "Tokens generated by the review model", labels=("model",))
+LLM_TOKENS_PER_SECOND = Histogram(
+    "codelens_llm_tokens_per_second", "Generated tokens per second of each generate call", labels=("model",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+)
+LLM_BATCH_SIZE = Histogram("codelens_llm_batch_size", "Prompts per generate call", buckets=(1, 2, 4, 8, 16, 32, 64))
+PROMPT_TEMPLATE_VERSION = hashlib.sha256(
+    "\0".join([PROMPT_HEADER, PROMPT_EXAMPLE, PROMPT_REVIEW, CHUNK_FEEDBACK]).encode("utf-8")
+).hexdigest()[:16]
+
+class CallbackStreamer(TextStreamer):
+    """Forwards decoded text to a callback as soon as generate produces it."""
+
+    def __init__(self, tokenizer, on_token: Callable[[str], None]):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.on_token = on_token
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.on_token(text)
+
+# a prompt string, or (header, examples, review) parts whose prefixes can be cached
+Prompt = Union[str, Tuple[str, str, str]]
+
+def _prompt_ids(tokenizer, prompt: Prompt) -> Tuple[List[int], List[int]]:
+    """Token ids of a prompt and the lengths of its cacheable prefixes (header, header + examples).
+
+    Parts are tokenized separately so a prefix has the same ids in every prompt
+    that starts with it, whichever path generates the prompt.
+    """
+    if isinstance(prompt, str):
+        return tokenizer(prompt)["input_ids"], []
+    header, examples, review = prompt
+    ids = list(tokenizer(header)["input_ids"])
+    prefixes = [len(ids)]
+    if examples:
+        ids += tokenizer(examples, add_special_tokens=False)["input_ids"]
+        prefixes.append(len(ids))
+    ids += tokenizer(review, add_special_tokens=False)["input_ids"]
+    return ids, prefixes
+
+def _eos_ids(tokenizer, model) -> set:
+    eos = getattr(getattr(model, "generation_config", None), "eos_token_id", None)
+    if eos is None:
+        eos = tokenizer.eos_token_id
+    return set(eos) if isinstance(eos, (list, tuple)) else {eos}
+
+def _forward(model, input_ids: Sequence[int], past, past_len: int):
+    """Run `input_ids` after `past_len` cached tokens. Returns (last logits, legacy past_key_values)."""
+    x = torch.tensor([list(input_ids)], device=model.device)
+    mask = torch.ones((1, past_len + len(input_ids)), dtype=torch.long, device=model.device)
+    out = model(input_ids=x, past_key_values=past, attention_mask=mask, use_cache=True)
+    past = out.past_key_values
+    if hasattr(past, "to_legacy_cache"):
+        past = past.to_legacy_cache()
+    return out.logits[:, -1, :], past
+
+def _generate_with_prefix_cache(model, cache: PrefixKVCache, ids: List[int], prefixes: List[int],
+                                max_new_tokens: int, eos: set, streamer: Optional[TextStreamer] = None) -> List[int]:
+    """Greedy decoding that starts from the longest cached prefix of `ids` and caches the prefixes it computes."""
+    prefill_start = time.perf_counter()
+    start, past = 0, None
+    for end in reversed(prefixes):
+        past = cache.get(tuple(ids[:end]))
+        if past is not None:
+            start = end
+            break
+    for end in prefixes:
+        if end > start:
+            _, past = _forward(model, ids[start:end], past, start)
+            cache.put(tuple(ids[:end]), past)
+            start = end
+    logits, past = _forward(model, ids[start:], past, start)
+
+    record_stage("llm_prefill", time.perf_counter() - prefill_start)
+
+    if streamer is not None:
+        streamer.put(torch.tensor([ids]))  # skipped as the prompt
+    new_ids: List[int] = []
+    while len(new_ids) < max_new_tokens:
+        token = int(logits[0].argmax())
+        if token in eos:
+            break
+        new_ids.append(token)
+        if streamer is not None:
+            streamer.put(torch.tensor([token]))
+        if len(new_ids) < max_new_tokens:
+            logits, past = _forward(model, [token], past, len(ids) + len(new_ids) - 1)
+    if streamer is not None:
+        streamer.end()
+    return new_ids
+
+def _record_generation(model_name: str, tokens: int, seconds: float, batch_size: int):
+    LLM_TOKENS.inc(tokens, (model_name,))
+    if seconds > 0:
+        LLM_TOKENS_PER_SECOND.observe(tokens / seconds, (model_name,))
+    LLM_BATCH_SIZE.observe(batch_size)
+    record_stage("llm_generate", seconds)
+
+def _hash_parts(parts: Sequence[str]) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def _release_gpu_cache():
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
 
 class BaseReviewEngine(ABC):
-    def __init__(self, model_name: str, use_gpu: bool = True):
+    # Bump when review() changes in a way that invalidates cached results
+    ENGINE_VERSION = "3"
+    language = "Python"
+    # Picklable (code, filename, rule_sets) -> (architecture, security findings); may run in a worker process
+    static_analyzer: Callable[
+        [str, Optional[str], Optional[Tuple[str, ...]]], Tuple[List[ArchitectureMetric], List[SecurityFinding]]
+    ]
+
+    def __init__(self, model_name: str, use_gpu: bool = True, inference_mode: str = LLM_INFERENCE_MODE):
         self.device = 0 if (use_gpu and torch.cuda.is_available()) else -1
         print(f"Using device: {'GPU' if self.device == 0 else 'CPU'}")
         self.model_name = model_name
-        self.personal = PersonalizationStore("personal.db")
-        self.pipe = self._load_llm()
+        self.personal = get_personalization_store("personal.db")
+        self.inference_mode = resolve_inference_mode(self.device, inference_mode)
+        # loaded on first use and shared with every engine using the same model and mode
+        self.models = get_model_registry()
+        self.model_key = f"llm:{model_name}:{self.inference_mode}"
+        self.models.register(self.model_key, self._load_llm, unload=_release_gpu_cache)
+        self.tokenizer_key = f"tokenizer:{model_name}"
+        self.models.register(self.tokenizer_key, self._load_tokenizer)
+        self.batcher = BatchScheduler(
+            self._generate_batch, max_batch_size=LLM_MAX_BATCH_SIZE, max_wait_ms=LLM_MAX_WAIT_MS
+        )
 
-    def _load_llm(self):
+    def _load_tokenizer(self):
         tokenizer = AutoTokenizer.from_pretrained(
             self.model_name, trust_remote_code=True, token=HUGGINGFACE_TOKEN
         )
-        model = AutoModelForCausalLM.from_pretrained(
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        # decoder-only models must be left padded so generation continues from the prompt
+        tokenizer.padding_side = "left"
+        return tokenizer
+
+    def _load_llm(self):
+        tokenizer = self._load_tokenizer()
+        model, mode = load_causal_lm(self.model_name, self.device, mode=self.inference_mode, token=HUGGINGFACE_TOKEN)
+        logger.info(f"Inference mode: {mode}")
+        # past key/values of prompt prefixes belong to the loaded weights and go away with them
+        return tokenizer, model, PrefixKVCache()
+
+    def run_llm(self, prompt: Prompt, max_new_tokens: int = LLM_MAX_NEW_TOKENS,
+                on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Generate feedback for `prompt`, batched with concurrent callers.
+
+        `prompt` is a string or the (header, examples, review) parts from
+        build_prompt_parts, whose header and examples prefixes are prefilled once
+        and reused. When `on_token` is given the prompt is generated on its own
+        so text can be streamed to the callback while it is produced.
+        """
+        with timed("llm"):
+            if on_token is not None:
+                return self._generate_streaming(prompt, max_new_tokens, on_token)
+            return self.batcher.submit(prompt, max_new_tokens).result()
+
+    def _generate_streaming(self, prompt: Prompt, max_new_tokens: int, on_token: Callable[[str], None]) -> str:
+        with self.models.lease(self.model_key) as (tokenizer, model, prefix_cache):
+            ids, prefixes = _prompt_ids(tokenizer, prompt)
+            streamer = CallbackStreamer(tokenizer, on_token)
+            start = time.perf_counter()
+            with torch.no_grad():
+                if prefixes and prefix_cache.enabled:
+                    new_ids = _generate_with_prefix_cache(model, prefix_cache, ids, prefixes, max_new_tokens,
+                                                          _eos_ids(tokenizer, model), streamer)
+                else:
+                    input_ids = torch.tensor([ids], device=model.device)
+                    out = model.generate(
+                        input_ids=input_ids,
+                        attention_mask=torch.ones_like(input_ids),
+                        max_new_tokens=max_new_tokens,
+                        do_sample=False,
+                        pad_token_id=tokenizer.pad_token_id,
+                        streamer=streamer
+                    )
+                    new_ids = out[0, len(ids):]
+            _record_generation(self.model_key, len(new_ids), time.perf_counter() - start, 1)
+            text = tokenizer.decode(new_ids, skip_special_tokens=True)
+            return text.split("Feedback:")[-1].strip()
+
+    def _generate_batch(self, prompts: List[Prompt], max_new_tokens: int) -> List[str]:
+        with self.models.lease(self.model_key) as (tokenizer, model, prefix_cache):
+            encoded = [_prompt_ids(tokenizer, prompt) for prompt in prompts]
+            start = time.perf_counter()
+            with torch.no_grad():
+                if len(encoded) == 1 and encoded[0][1] and prefix_cache.enabled:
+                    # a lone prompt gains nothing from batching but skips its prefix prefill
+                    ids, prefixes = encoded[0]
+                    new_ids = [_generate_with_prefix_cache(model, prefix_cache, ids, prefixes, max_new_tokens,
+                                                           _eos_ids(tokenizer, model))]
+                    n_tokens = len(new_ids[0])
+                else:
+                    inputs = tokenizer.pad({"input_ids": [ids for ids, _ in encoded]}, return_tensors="pt").to(model.device)
+                    out = model.generate(
+                        **inputs,
+                        max_new_tokens=max_new_tokens,
+                        do_sample=False,
+                        pad_token_id=tokenizer.pad_token_id
+                    )
+                    new_ids = out[:, inputs["input_ids"].shape[1]:]
+                    n_tokens = int((new_ids != tokenizer.pad_token_id).sum())
+            _record_generation(self.model_key, n_tokens, time.perf_counter() - start, len(prompts))
+            texts = tokenizer.batch_decode(new_ids, skip_special_tokens=True)
+            return [text.split("Feedback:")[-1].strip() for text in texts]
+
+    def count_tokens(self, text: str) -> int:
+        with self.models.lease(self.tokenizer_key) as tokenizer:
+            return len(tokenizer.encode(text, add_special_tokens=False))
+
+    def chunk_code(self, code: str) -> List[CodeChunk]:
+        return chunk_source(code, self.count_tokens, LLM_CHUNK_TOKENS)
+
+    def build_prompt_parts(self, code: str, language: str = "Python",
+                           examples: Optional[List[Tuple[str, str]]] = None) -> Tuple[str, str, str]:
+        """(header, few-shot examples, review request) for `code`, within LLM_MAX_PROMPT_TOKENS.
+
+        Few-shot examples are added most similar first while they fit; the last
+        one that fits only partly has its code cut at a line boundary.
+        """
+        if examples is None:
+            examples = self.personal.get_examples(code, k=3)
+        header = PROMPT_HEADER.format(language=language)
+        review = PROMPT_REVIEW.format(code=code)
+        remaining = LLM_MAX_PROMPT_TOKENS - self.count_tokens(header) - self.count_tokens(review)
+        shots = ""
+        for ex_code, ex_feedback in examples:
+            fits = lambda c: self.count_tokens(PROMPT_EXAMPLE.format(code=c, feedback=ex_feedback)) <= remaining
+            ex_code = ex_code if fits(ex_code) else truncate_lines(ex_code, fits)
+            if ex_code is None:
+                break
+            example = PROMPT_EXAMPLE.format(code=ex_code, feedback=ex_feedback)
+            shots += example
+            remaining -= self.count_tokens(example)
+        return header, shots, review
+
+    def build_prompt(self, code: str, language: str = "Python",
+                     examples: Optional[List[Tuple[str, str]]] = None) -> str:
+        return "".join(self.build_prompt_parts(code, language=language, examples=examples))
+
+    def generate_feedback(self, code: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Feedback for a whole file.
+
+        Files over LLM_CHUNK_TOKENS are reviewed in chunks along function and class
+        boundaries, generated as one batch, and the feedback is labelled with each
+        chunk's line range.
+        """
+        chunks = self.chunk_code(code)
+        examples = self.personal.get_examples(code, k=3)
+        prompts = [self.build_prompt_parts(chunk.code, language=self.language, examples=examples) for chunk in chunks]
+        if len(chunks) == 1:
+            return self.run_llm(prompts[0], on_token=on_token)
+
+        if on_token is None:
+            futures = [self.batcher.submit(prompt, LLM_MAX_NEW_TOKENS) for prompt in prompts]
+            feedback = [future.result() for future in futures]
+        else:
+            feedback = []
+            for i, (chunk, prompt) in enumerate(zip(chunks, prompts)):
+                on_token(("\n\n" if i else "") + CHUNK_FEEDBACK.format(start=chunk.start_line, end=chunk.end_line, feedback=""))
+                feedback.append(self.run_llm(prompt, on_token=on_token))
+        return "\n\n".join(
+            CHUNK_FEEDBACK.format(start=chunk.start_line, end=chunk.end_line, feedback=text)
+            for chunk, text in zip(chunks, feedback)
+        )
+
+    def assemble_review(self, feedback: str, arch, sec) -> ReviewOutput:
+        return ReviewOutput(
+            final_feedback=feedback,
+            architecture=[ArchitectureMetric(**(a.dict() if hasattr(a, "dict") else a)) for a in arch],
+            security_findings=[SecurityFinding(**(s.dict() if hasattr(s, "dict") else s)) for s in sec]
+        )
+
+    def _config_parts(self, rule_sets: Tuple[str, ...]) -> Tuple[str, ...]:
+        return (
+            type(self).__name__,
+            self.ENGINE_VERSION,
             self.model_name,
-            torch_dtype=torch.float16 if self.device == 0 else torch.float32,
-            low_cpu_mem_usage=True,
-            trust_remote_code=True,
-            token=HUGGINGFACE_TOKEN
+            self.inference_mode,  # quantized modes can word feedback differently
+            PROMPT_TEMPLATE_VERSION,
+            f"{LLM_MAX_PROMPT_TOKENS}:{LLM_CHUNK_TOKENS}:{LLM_MAX_NEW_TOKENS}",
+            self.personal.corpus_version(),
+            ",".join(rule_sets),
         )
-        pipe = pipeline("text-generation", model=model, tokenizer=tokenizer, device=self.device)
-        if getattr(pipe, "tokenizer", None) and getattr(pipe.tokenizer, "pad_token", None) is None:
-            pipe.tokenizer.pad_token = pipe.tokenizer.eos_token
-        return pipe
 
-    def run_llm(self, prompt: str, max_new_tokens: int = 128) -> str:
-        out = self.pipe(prompt, max_new_tokens=max_new_tokens, do_sample=False)
-        text = out[0]["generated_text"] or out[0].get("text") or ""
-        return text.split("Feedback:")[-1].strip()
+    def config_key(self, rule_sets: Tuple[str, ...] = ()) -> str:
+        """Hash of everything besides the code that shapes this engine's reviews."""
+        return _hash_parts(self._config_parts(rule_sets))
 
-    def build_prompt(self, code: str, language: str = "Python") -> str:
-        examples = self.personal.get_examples(code, k=3)
-        prompt = f"You are a senior {language} software engineer. Provide concise, actionable review feedback."
-        for ex_code, ex_feedback in examples:
-            prompt += f"\nExample Code:\n{ex_code}\nExample Feedback:\n{ex_feedback}\n"
-        prompt += f"\nReview this code:\n{code}\nFeedback:\n"
-        return prompt
+    def cache_key(self, code: str, rule_sets: Tuple[str, ...] = ()) -> str:
+        """Content hash identifying a review of `code` by this engine configuration and security rule sets."""
+        return _hash_parts((*self._config_parts(rule_sets), code))
 
     @abstractmethod
-    def review(self, code: str, filename: str = None) -> ReviewOutput:
+    def review(self, code: str, filename: str = None,
+               on_token: Optional[Callable[[str], None]] = None,
+               rule_sets: Optional[Tuple[str, ...]] = None) -> ReviewOutput:
         ...
\ No newline at end of file
@@ -0,0 +1,71 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Tuple
+from core.logging_config import logger
+from core.metrics import SharedTimings, current_job_timings
+
+class BatchScheduler:
+    """Groups prompts submitted from many threads into batched generate calls.
+
+    A single background thread waits for the first prompt, then keeps collecting
+    until `max_batch_size` prompts are queued or `max_wait_ms` has passed, and
+    hands the batch to `generate_batch`. Prompts with different `max_new_tokens`
+    are never mixed in one batch. Stages recorded while a batch is generated are
+    charged to every job that submitted one of its prompts.
+    """
+
+    def __init__(self, generate_batch: Callable[[List[Any], int], List[str]],
+                 max_batch_size: int = 8, max_wait_ms: float = 10.0):
+        self.generate_batch = generate_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        # (prompt, max_new_tokens, future, timings of the submitting job)
+        self._queue: "queue.Queue[Tuple[Any, int, Future, Any]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="llm-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt: Any, max_new_tokens: int) -> Future:
+        future: Future = Future()
+        self._queue.put((prompt, max_new_tokens, future, current_job_timings.get()))
+        return future
+
+    def _collect(self) -> List[Tuple[Any, int, Future, Any]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[1], []).append(item)
+
+            for max_new_tokens, items in groups.items():
+                live = [(p, f, t) for p, _, f, t in items if f.set_running_or_notify_cancel()]
+                if not live:
+                    continue
+                prompts = [p for p, _, _ in live]
+                futures = [f for _, f, _ in live]
+                token = current_job_timings.set(SharedTimings(t for _, _, t in live))
+                try:
+                    outputs = self.generate_batch(prompts, max_new_tokens)
+                except Exception as e:
+                    logger.exception(f"Batched generation failed for {len(prompts)} prompt(s): {e}")
+                    for f in futures:
+                        f.set_exception(e)
+                    continue
+                finally:
+                    current_job_timings.reset(token)
+                for f, text in zip(futures, outputs):
+                    f.set_result(text)
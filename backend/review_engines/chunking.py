@@ -0,0 +1,130 @@
+import ast
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from parsed_module import ParsedModule
+
+DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+class CodeChunk(NamedTuple):
+    start_line: int  # 1-based, inclusive
+    end_line: int
+    code: str
+
+def _start_line(node: ast.AST) -> int:
+    # decorators belong to the definition they decorate
+    return min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+
+def _children(node: ast.AST) -> List[ast.AST]:
+    nodes = []
+    for field in ("body", "handlers", "orelse", "finalbody"):
+        nodes.extend(getattr(node, field, None) or [])
+    return sorted((n for n in nodes if hasattr(n, "lineno")), key=_start_line)
+
+class _Chunker:
+    def __init__(self, module: ParsedModule, count_tokens: Callable[[str], int], budget: int):
+        self.module = module
+        self.count_tokens = count_tokens
+        self.budget = budget
+        self._counts: Dict[Tuple[int, int], int] = {}
+
+    def text(self, start: int, end: int) -> str:
+        offsets = self.module.line_offsets
+        stop = offsets[end] if end < len(offsets) else len(self.module.source)
+        return self.module.source[offsets[start - 1]:stop]
+
+    def count(self, start: int, end: int) -> int:
+        if (start, end) not in self._counts:
+            self._counts[(start, end)] = self.count_tokens(self.text(start, end))
+        return self._counts[(start, end)]
+
+    def spans(self, stmts: List[ast.AST], first: int, last: int, group: bool = True):
+        """Cut lines first..last before each statement, keeping runs of non-definitions together if `group`.
+
+        Lines between statements (comments, blank lines) stay with the statement above.
+        """
+        cuts: List[Tuple[int, List[ast.AST]]] = []
+        for stmt in stmts:
+            if not group or not cuts or isinstance(stmt, DEFINITIONS) or isinstance(cuts[-1][1][-1], DEFINITIONS):
+                cuts.append((_start_line(stmt), [stmt]))
+            else:
+                cuts[-1][1].append(stmt)
+        spans = []
+        for i, (start, nodes) in enumerate(cuts):
+            end = cuts[i + 1][0] - 1 if i + 1 < len(cuts) else last
+            spans.append((first if i == 0 else start, end, nodes))
+        return spans or [(first, last, [])]
+
+    def pieces(self, start: int, end: int, nodes: List[ast.AST]) -> List[Tuple[int, int]]:
+        """Line ranges within the budget, split at the outermost statement boundaries that make them fit."""
+        if self.count(start, end) <= self.budget:
+            return [(start, end)]
+        if len(nodes) > 1:
+            spans = self.spans(nodes, start, end, group=False)
+        elif nodes and _children(nodes[0]):
+            # a definition or block too large on its own: its header goes with the first part of its body
+            spans = self.spans(_children(nodes[0]), start, end)
+        else:
+            return self.windows(start, end)
+        result = []
+        for s, e, n in spans:
+            result.extend(self.pieces(s, e, n))
+        return result
+
+    def windows(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """Consecutive lines up to the budget; the last resort for single oversized statements."""
+        result, window_start, used = [], start, 0
+        for line in range(start, end + 1):
+            tokens = self.count(line, line)
+            if used and used + tokens > self.budget:
+                result.append((window_start, line - 1))
+                window_start, used = line, 0
+            used += tokens
+        result.append((window_start, end))
+        return result
+
+def chunk_source(code: str, count_tokens: Callable[[str], int], budget: int,
+                 filename: Optional[str] = None) -> List[CodeChunk]:
+    """Split source into chunks of at most `budget` tokens along top-level function and class boundaries.
+
+    Consecutive definitions are packed into one chunk while they fit; a
+    definition larger than the budget is split between its own statements,
+    and code that does not parse is split by lines. The result depends only on
+    the source, the tokenizer and the budget.
+    """
+    module = ParsedModule(code, filename)
+    chunker = _Chunker(module, count_tokens, budget)
+    last = len(module.line_offsets)
+    if code.endswith("\n") and last > 1:
+        last -= 1  # no line after the final newline
+
+    if chunker.count(1, last) <= budget:
+        return [CodeChunk(1, last, code)]
+    if module.ok:
+        pieces = []
+        for start, end, nodes in chunker.spans(module.body, 1, last):
+            pieces.extend(chunker.pieces(start, end, nodes))
+    else:
+        pieces = chunker.windows(1, last)
+
+    chunks: List[Tuple[int, int]] = []
+    used = 0
+    for start, end in pieces:
+        tokens = chunker.count(start, end)
+        if chunks and used + tokens <= budget:
+            chunks[-1] = (chunks[-1][0], end)
+            used += tokens
+        else:
+            chunks.append((start, end))
+            used = tokens
+    return [CodeChunk(start, end, chunker.text(start, end)) for start, end in chunks]
+
+def truncate_lines(text: str, fits: Callable[[str], bool]) -> Optional[str]:
+    """Longest prefix of whole lines of `text` for which `fits` holds, or None if not even one line fits."""
+    lines = text.splitlines(keepends=True)
+    lo, hi = 0, len(lines)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if fits("".join(lines[:mid])):
+            lo = mid
+        else:
+            hi = mid - 1
+    return "".join(lines[:lo]) if lo else None
@@ -0,0 +1,91 @@
+import os
+import torch
+from typing import Optional
+from transformers import AutoModelForCausalLM
+from review_engines.mmap_weights import load_mmap_model
+from core.logging_config import logger
+
+# fp32 | int8 | bf16 | onnx; applies to CPU only, GPUs always run fp16
+LLM_INFERENCE_MODE = os.getenv("LLM_INFERENCE_MODE", "fp32").lower()
+LLM_TORCH_COMPILE = os.getenv("LLM_TORCH_COMPILE", "0") == "1"
+# intra-op threads for CPU inference; 0 keeps torch's default (one per physical core)
+LLM_NUM_THREADS = int(os.getenv("LLM_NUM_THREADS", "0"))
+# "load" copies weights into each process; "mmap" maps the safetensors checkpoint so
+# processes on one host share a single physical copy (fp32 and bf16 CPU modes)
+LLM_WEIGHTS = os.getenv("LLM_WEIGHTS", "load").lower()
+
+INFERENCE_MODES = ("fp32", "int8", "bf16", "onnx")
+
+def configure_threads(num_threads: int = LLM_NUM_THREADS):
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    logger.info(f"CPU inference threads: {torch.get_num_threads()}")
+
+def cpu_supports_bf16() -> bool:
+    """True when the CPU has native bfloat16 instructions (AVX512-BF16 or AMX)."""
+    try:
+        with open("/proc/cpuinfo") as fh:
+            flags = fh.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+def resolve_inference_mode(device: int, mode: str = LLM_INFERENCE_MODE) -> str:
+    """The mode a model will actually run in on `device`, known before loading it."""
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Unknown inference mode '{mode}', expected one of {', '.join(INFERENCE_MODES)}")
+    if device == 0:
+        return "fp16"
+    if mode == "bf16" and not cpu_supports_bf16():
+        logger.warning("CPU has no native bfloat16 support, falling back to fp32")
+        return "fp32"
+    return mode
+
+def load_causal_lm(model_name: str, device: int, mode: str = LLM_INFERENCE_MODE,
+                   compile: bool = LLM_TORCH_COMPILE, token: Optional[str] = None, weights: str = LLM_WEIGHTS):
+    """Load `model_name` for generation in the given inference mode.
+
+    Every mode returns an object with the transformers `generate` interface, so
+    callers do not depend on the mode. Returns (model, effective mode).
+    """
+    mode = resolve_inference_mode(device, mode)
+    if device == 0:
+        model = AutoModelForCausalLM.from_pretrained(
+            model_name, torch_dtype=torch.float16, low_cpu_mem_usage=True, trust_remote_code=True, token=token
+        )
+        return model.to("cuda").eval(), "fp16"
+
+    configure_threads()
+    if mode == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForCausalLM
+        except ImportError as e:
+            raise RuntimeError("LLM_INFERENCE_MODE=onnx requires `optimum[onnxruntime]`") from e
+        # exports the checkpoint to ONNX on first use; the export is cached by optimum
+        return ORTModelForCausalLM.from_pretrained(model_name, export=True, use_cache=True, token=token), mode
+
+    dtype = torch.bfloat16 if mode == "bf16" else torch.float32
+    if weights == "mmap" and mode == "int8":
+        logger.warning("int8 quantization rewrites the weights, loading them instead of memory-mapping")
+    if weights == "mmap" and mode != "int8":
+        model = load_mmap_model(model_name, dtype, token=token)
+    else:
+        model = AutoModelForCausalLM.from_pretrained(
+            model_name,
+            torch_dtype=dtype,
+            low_cpu_mem_usage=True,
+            trust_remote_code=True,
+            token=token
+        ).eval()
+
+    if mode == "int8":
+        # weights of Linear layers stored as int8, activations quantized per batch at run time
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    if compile and not hasattr(torch, "compile"):
+        logger.warning("torch.compile needs torch>=2.0, running uncompiled")
+    elif compile:
+        # dynamic shapes: prompt lengths and batch sizes vary between calls
+        model.forward = torch.compile(model.forward, dynamic=True)
+        mode += "+compile"
+    return model, mode
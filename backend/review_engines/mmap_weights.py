@@ -0,0 +1,117 @@
+import os
+import json
+import mmap
+import glob
+import struct
+import hashlib
+import tempfile
+import torch
+from typing import Dict, List, Optional
+from accelerate import init_empty_weights
+from huggingface_hub import snapshot_download
+from transformers import AutoConfig, AutoModelForCausalLM
+from core.logging_config import logger
+
+# converted checkpoints, when the published one is not stored in the dtype being served
+LLM_MMAP_CACHE_DIR = os.getenv("LLM_MMAP_CACHE_DIR", os.path.join(tempfile.gettempdir(), "codelens-weights"))
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+    "U8": torch.uint8, "BOOL": torch.bool,
+}
+
+def map_safetensors(path: str) -> Dict[str, torch.Tensor]:
+    """Tensors of a .safetensors file, backed by a private memory map of the file.
+
+    Nothing is read up front: pages come from the OS page cache on first access,
+    and every process mapping the same file shares those pages. The mapping is
+    copy-on-write, so a tensor that is modified gets a private copy of the pages
+    it touches.
+    """
+    with open(path, "rb") as fh:
+        header_len = struct.unpack("<Q", fh.read(8))[0]
+        header = json.loads(fh.read(header_len))
+        mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_COPY)
+    data_start = 8 + header_len
+
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        if end == begin:
+            tensors[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        count = (end - begin) // torch.tensor([], dtype=dtype).element_size()
+        # the tensor holds a reference to the map, which stays open while any tensor uses it
+        tensors[name] = torch.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + begin).view(info["shape"])
+    return tensors
+
+def _checkpoint_files(model_name: str, token: Optional[str]) -> List[str]:
+    local_dir = model_name if os.path.isdir(model_name) else snapshot_download(
+        model_name, allow_patterns=["*.safetensors", "*.json"], token=token
+    )
+    return sorted(glob.glob(os.path.join(local_dir, "*.safetensors")))
+
+def _convert(files: List[str], dtype: torch.dtype, target: str):
+    from safetensors.torch import save_file
+    tensors = {}
+    for path in files:
+        for name, tensor in map_safetensors(path).items():
+            tensors[name] = tensor.to(dtype) if tensor.is_floating_point() else tensor.clone()
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    partial = f"{target}.{os.getpid()}.partial"
+    save_file(tensors, partial)
+    os.replace(partial, target)  # concurrent converters all produce the same file
+
+def mmap_checkpoint(model_name: str, dtype: torch.dtype, token: Optional[str] = None) -> List[str]:
+    """Safetensors files of `model_name` with floating point weights stored as `dtype`.
+
+    The published files are used as they are when they match; otherwise a
+    converted copy is written once to LLM_MMAP_CACHE_DIR and reused by every
+    process.
+    """
+    files = _checkpoint_files(model_name, token)
+    if not files:
+        raise FileNotFoundError(f"No safetensors checkpoint found for '{model_name}'")
+    dtypes = {t.dtype for path in files for t in map_safetensors(path).values() if t.is_floating_point()}
+    if dtypes <= {dtype}:
+        return files
+
+    key = hashlib.sha256(model_name.encode("utf-8")).hexdigest()[:16]
+    target = os.path.join(LLM_MMAP_CACHE_DIR, f"{key}-{str(dtype).split('.')[-1]}.safetensors")
+    if not os.path.exists(target):
+        logger.info(f"Converting '{model_name}' weights to {dtype} at {target}")
+        _convert(files, dtype, target)
+    return [target]
+
+def load_mmap_model(model_name: str, dtype: torch.dtype, token: Optional[str] = None):
+    """Build `model_name` with its weights memory-mapped from the checkpoint instead of copied into RAM."""
+    config = AutoConfig.from_pretrained(model_name, trust_remote_code=True, token=token)
+    # parameters are created on the meta device (no memory); buffers are real
+    with init_empty_weights():
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=dtype, trust_remote_code=True)
+
+    names = {name for name, _ in model.named_parameters()} | {name for name, _ in model.named_buffers()}
+    prefix = f"{model.base_model_prefix}."
+    for path in mmap_checkpoint(model_name, dtype, token):
+        for name, tensor in map_safetensors(path).items():
+            if name not in names:
+                # checkpoints saved from the base model lack the prefix, and vice versa
+                name = prefix + name if prefix + name in names else name[len(prefix):]
+                if name not in names:
+                    continue
+            module_name, _, attr = name.rpartition(".")
+            module = model.get_submodule(module_name)
+            if attr in module._parameters:
+                module._parameters[attr] = torch.nn.Parameter(tensor, requires_grad=False)
+            else:
+                module._buffers[attr] = tensor
+
+    model.tie_weights()
+    missing = [name for name, param in model.named_parameters() if param.is_meta]
+    if missing:
+        raise ValueError(f"Checkpoint for '{model_name}' has no weights for {', '.join(missing[:5])}")
+    return model.eval()
@@ -0,0 +1,57 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+# memory for cached prompt prefixes per loaded model; 0 disables the cache.
+# Only single-prompt batches and streaming use it: multi-prompt batches prefill in full.
+LLM_PREFIX_CACHE_MB = float(os.getenv("LLM_PREFIX_CACHE_MB", "256"))
+
+def kv_nbytes(past: Any) -> int:
+    """Bytes held by a (nested tuple) past_key_values."""
+    if isinstance(past, (tuple, list)):
+        return sum(kv_nbytes(item) for item in past)
+    return past.numel() * past.element_size() if past is not None else 0
+
+class PrefixKVCache:
+    """LRU of past key/values for token prefixes shared by many prompts.
+
+    Keys are the prefix token ids. Values are legacy tuple caches, which the
+    model never modifies in place (extending them creates new tensors), so one
+    entry can seed any number of generations, concurrently.
+    """
+
+    def __init__(self, max_bytes: int = int(LLM_PREFIX_CACHE_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Tuple[int, ...], Tuple[Any, int]]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, prefix: Tuple[int, ...]) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(prefix)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(prefix)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, prefix: Tuple[int, ...], past: Any):
+        size = kv_nbytes(past)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if prefix in self.entries:
+                return
+            self.entries[prefix] = (past, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted
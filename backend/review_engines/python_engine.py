@@ -1,23 +1,22 @@
 from review_engines.base import BaseReviewEngine
-from analyzer import analyze_code
-from security import scan_code
-from schemas import ReviewOutput, ArchitectureMetric, SecurityFinding
+from static_analysis import analyze_python
+from schemas import ReviewOutput
+from core.metrics import timed
+from typing import Callable, Optional, Tuple
 
 DEFAULT_MODEL = "refactai/Refact-1_6B-fim"
 
 class PythonReviewEngine(BaseReviewEngine):
+    language = "Python"
+    static_analyzer = staticmethod(analyze_python)
+
     def __init__(self, model_name: str = DEFAULT_MODEL, use_gpu: bool = True):
         super().__init__(model_name=model_name, use_gpu=use_gpu)
 
-    def review(self, code: str, filename: str = None) -> ReviewOutput:
-        arch = analyze_code(code, filename)
-        sec = scan_code(code, filename)
-
-        prompt = self.build_prompt(code, language="Python")
-        feedback = self.run_llm(prompt)
-
-        return ReviewOutput(
-            final_feedback=feedback,
-            architecture=[ArchitectureMetric(**(a.dict() if hasattr(a, "dict") else a)) for a in arch],
-            security_findings=[SecurityFinding(**(s.dict() if hasattr(s, "dict") else s)) for s in sec]
-        )
\ No newline at end of file
+    def review(self, code: str, filename: str = None,
+               on_token: Optional[Callable[[str], None]] = None,
+               rule_sets: Optional[Tuple[str, ...]] = None) -> ReviewOutput:
+        with timed("review"):
+            arch, sec = self.static_analyzer(code, filename, rule_sets)
+            feedback = self.generate_feedback(code, on_token=on_token)
+            return self.assemble_review(feedback, arch, sec)
@@ -1,11 +1,12 @@
 from pydantic import BaseModel, Field, model_validator
-from typing import List, Optional, Dict
+from typing import Any, Dict, List, Optional
 
 class ReviewRequest(BaseModel):
     code: Optional[str] = Field(None, description="Raw source code string")
     filename: Optional[str] = Field(None, description="Local file path")
     uploaded_file_path: Optional[str] = Field(None, description="Path to uploaded file or zip")
     git_url: Optional[str] = Field(None, description="GitHub repository URL")
+    git_ref: Optional[str] = Field(None, description="Branch, tag or commit to review (default branch if omitted)")
     repo: Optional[str] = Field(None, description="Logical repo identifier for context")
 
     @model_validator(mode="before")
@@ -17,6 +18,7 @@ class ReviewRequest(BaseModel):
 class ArchitectureMetric(BaseModel):
     name: str
     dot_diagram: str
+    graph: Optional[Dict[str, Any]] = Field(None, description="Nodes and edges of the diagram as JSON")
 
 class SecurityFinding(BaseModel):
     issue: str
@@ -32,12 +34,39 @@ class FileReview(BaseModel):
     filename: Optional[str] = Field(None, description="Name/path of the file")
     code: str = Field(..., description="Source code of the file")
     review: Optional[ReviewOutput] = Field(None, description="Review output for the file")
+    error: Optional[str] = Field(None, description="Error message if this file could not be reviewed")
+    repo_path: Optional[str] = Field(None, description="Path relative to the repository root (git sources)")
+    blob_sha: Optional[str] = Field(None, description="Git blob sha of the file contents (git sources)")
+
+class ModuleRank(BaseModel):
+    module: str
+    path: str
+    count: int
+
+class RepoArchitecture(BaseModel):
+    module_count: int
+    edge_count: int
+    cycles: List[List[str]] = Field(default_factory=list, description="Modules of each import cycle (strongly connected component)")
+    fan_in: List[ModuleRank] = Field(default_factory=list, description="Modules imported by the most other modules")
+    fan_out: List[ModuleRank] = Field(default_factory=list, description="Modules importing the most other modules")
+    external_imports: Dict[str, int] = Field(default_factory=dict, description="Top-level external packages by importing modules")
+    graph: Optional[Dict[str, Any]] = Field(None, description="Module import graph as JSON")
+    dot_diagram: Optional[str] = Field(None, description="Module import graph as DOT, for repositories small enough to draw")
+
+class QueueStatus(BaseModel):
+    lane: str  # "interactive" or "bulk"
+    position: int = Field(description="1 for the next job to be claimed")
+    depth: int = Field(description="Pending jobs in this lane")
+    estimated_wait_seconds: Optional[float] = Field(None, description="None until jobs of the lanes ahead have completed")
 
 class FinalReview(BaseModel):
     job_id: str
-    status: str  # "pending", "completed", "failed"
-    result: Optional[ReviewOutput] = None
+    status: str  # "pending", "running", "completed", "failed"
+    result: Optional[List[FileReview]] = None
     error: Optional[str] = None
+    architecture: Optional[RepoArchitecture] = None
+    timings: Optional[Dict[str, float]] = Field(None, description="Seconds per pipeline stage, summed over the job's files")
+    queue: Optional[QueueStatus] = None  # while the job is pending
 
 class Job(BaseModel):
     job_id: str
@@ -45,5 +74,8 @@ class Job(BaseModel):
     code: Optional[str] = None
     filename: Optional[str] = None
     repo: Optional[str] = None
-    result: Optional[ReviewOutput] = None
-    error: Optional[str] = None
\ No newline at end of file
+    result: Optional[List[FileReview]] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    architecture: Optional[RepoArchitecture] = None
+    timings: Optional[Dict[str, float]] = None
\ No newline at end of file
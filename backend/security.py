@@ -1,88 +1,62 @@
+import os
 import tempfile
-import ast
+import threading
 from bandit.core import manager, config, constants
-import tempfile
-from typing import List
+from typing import Dict, Iterable, List, Optional, Sequence
 from schemas import SecurityFinding
-
-def scan_code(code: str, filename: str=None) -> List[SecurityFinding]:
-    findings: List[SecurityFinding] = []
-
-    with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix='.py') as tmp:
-        tmp.write(code)
-        tmp.flush()
-
-        b_conf = config.BanditConfig()
-        mgr = manager.BanditManager(b_conf, 'file', verbose=False)
-        mgr.discover_files([tmp.name])
+from parsed_module import ParsedModule
+from security_rules import enabled_rule_sets, get_rule_engine
+
+_local = threading.local()
+
+def _bandit_config() -> config.BanditConfig:
+    """One parsed config per thread (and so per analysis worker process), reused for every batch."""
+    conf = getattr(_local, "bandit_config", None)
+    if conf is None:
+        conf = _local.bandit_config = config.BanditConfig()
+    return conf
+
+def bandit_scan(codes: Sequence[str]) -> List[List[SecurityFinding]]:
+    """Run bandit over many sources in one pass; returns the findings of each source, in order.
+
+    The batch is written to one scratch directory and scanned through bandit's
+    public manager API, with a fresh manager per batch (plugins are loaded once
+    per process, so creating one is cheap).
+    """
+    mgr = manager.BanditManager(_bandit_config(), 'file', verbose=False)
+    per_file: Dict[str, List[SecurityFinding]] = {}
+    with tempfile.TemporaryDirectory(prefix="bandit-") as scratch:
+        names = []
+        for i, code in enumerate(codes):
+            name = os.path.join(scratch, f"{i}.py")
+            with open(name, "w", encoding="utf-8") as fh:
+                fh.write(code)
+            names.append(name)
+            per_file[name] = []
+        mgr.discover_files(names)
         mgr.run_tests()
-
         for issue in mgr.get_issue_list(sev_level=constants.LOW, conf_level=constants.LOW):
-            findings.append(SecurityFinding(
-                issue=issue.text, 
+            per_file[issue.fname].append(SecurityFinding(
+                issue=issue.text,
                 severity=str(issue.severity),
                 line=issue.lineno or 0
             ))
+    return [per_file[name] for name in names]
 
-    try:
-        tree = ast.parse(code)
-        for node in ast.walk(tree):
-            # detect eval/exec
-            if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
-                if node.func.id in ('eval', 'exec'):
-                    findings.append(SecurityFinding(
-                        issue=f'Use of {node.func.id}()', 
-                        severity='HIGH', 
-                        line=node.lineno
-                    ))
-
-            # detect os.system or subprocess.* with shell=True
-            if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
-                func_name = f"{getattr(node.func.value, 'id', '')}.{node.func.attr}"
-                if func_name in ('os.system', 'subprocess.call', 'subprocess.Popen'):
-                    for kw in getattr(node, "keywords", []):
-                        if kw.arg == 'shell' and isinstance(kw.value, "value", False) is True:
-                            findings.append(SecurityFinding(
-                                issue=f'Use of {func_name} with shell=True - potential command injection', 
-                                severity='HIGH', 
-                                line=node.lineno
-                            ))
-
-            # detect possible hardcoded secrets
-            if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant):
-                val = str(node.value.value).lower()
-                if any(keyword in val for keyword in ['password', 'secret', 'token', 'api_key']):
-                    findings.append(SecurityFinding(
-                        issue='Potential hardcoded secret', 
-                        severity='MEDIUM', 
-                        line=node.lineno
-                    ))
-
-            # detect unsafe HTTP requests
-            if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
-                func_name = f"{getattr(node.func.value, 'id', '')}.{node.func.attr}"
-                if func_name.startswith("requests.") and any(arg for arg in node.args if isinstance(arg, ast.Constant)):
-                    url_arg = node.args[0].value if node.args and isinstance(node.args[0], ast.Constant) else ''
-                    if isinstance(url_arg, str) and url_arg.startswith('http://'):
-                        findings.append(SecurityFinding(
-                            issue='Insecure HTTP request (not HTTPS)', 
-                            severity='MEDIUM', 
-                            line=node.lineno
-                        ))
+def scan_code(code: str, filename: str=None, module: Optional[ParsedModule] = None,
+              rule_sets: Optional[Iterable[str]] = None) -> List[SecurityFinding]:
+    """Bandit plus the registered AST rules; `rule_sets` defaults to every set enabled globally."""
+    findings: List[SecurityFinding] = []
+    module = module or ParsedModule(code, filename)
+    rule_sets = frozenset(enabled_rule_sets() if rule_sets is None else rule_sets)
 
-                # detect potential data leakage via print/logging
-                for kw in getattr(node, "keywords", []):
-                    if kw.arg == "data" and isinstance(kw.value, ast.Dict):
-                        for val in kw.value.values:
-                            if isinstance(val, ast.Constant) and any(
-                                s in str(val.value).lower() for s in ['password', 'secret', 'token', 'apikey']
-                            ):
-                                findings.append(SecurityFinding(
-                                    issue='Potential sensitive data leakage via print/logging', 
-                                    severity='LOW', 
-                                    line=node.lineno
-                                ))
+    if "bandit" in rule_sets:
+        findings.extend(bandit_scan([code])[0])
 
+    try:
+        if not module.ok:
+            raise module.error
+        findings.extend(get_rule_engine(rule_sets).run(module))
     except Exception as e:
         findings.append(SecurityFinding(issue=f'Error parsing AST: {str(e)}', severity='LOW', line=0))
 
@@ -0,0 +1,58 @@
+import os
+import asyncio
+from concurrent.futures import Executor
+from typing import Callable, List, Optional, Tuple
+from schemas import SecurityFinding
+from security import bandit_scan
+
+# files per bandit run and how long the first file waits for company
+BANDIT_BATCH_FILES = int(os.getenv("BANDIT_BATCH_FILES", "32"))
+BANDIT_BATCH_WAIT_MS = float(os.getenv("BANDIT_BATCH_WAIT_MS", "20"))
+
+class BanditBatcher:
+    """Groups files scanned concurrently (within and across jobs) into batched bandit runs.
+
+    The first file of a batch waits up to `max_wait_ms` for others; a batch
+    runs as soon as it holds `max_batch_files`. Each batch is one call to
+    `bandit_scan` on the executor returned by `get_executor`, and each caller
+    gets back the findings of its own file.
+    """
+
+    def __init__(self, get_executor: Callable[[], Optional[Executor]],
+                 max_batch_files: int = BANDIT_BATCH_FILES, max_wait_ms: float = BANDIT_BATCH_WAIT_MS):
+        self.get_executor = get_executor
+        self.max_batch_files = max_batch_files
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def scan(self, code: str) -> List[SecurityFinding]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((code, future))
+        if len(self._pending) >= self.max_batch_files:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.get_executor(), bandit_scan, [code for code, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), findings in zip(batch, results):
+            if not future.done():
+                future.set_result(findings)
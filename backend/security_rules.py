@@ -0,0 +1,148 @@
+import os
+import ast
+import json
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Type
+from schemas import SecurityFinding
+from parsed_module import ParsedModule
+
+# JSON file choosing rule sets, globally and per repo:
+# {"disabled": ["network"], "repos": {"payments": {"enabled": ["network"], "disabled": ["bandit"]}}}
+SECURITY_RULES_CONFIG = os.getenv("SECURITY_RULES_CONFIG", "")
+
+SENSITIVE_WORDS = ('password', 'secret', 'token', 'api_key')
+SHELL_CALLS = ('os.system', 'subprocess.call', 'subprocess.Popen', 'subprocess.run',
+               'subprocess.check_call', 'subprocess.check_output')
+
+class ScanContext:
+    """Per-file state shared by rules, so values derived from a node are computed once."""
+
+    def __init__(self, module: ParsedModule):
+        self.module = module
+        self._call_names: Dict[int, str] = {}
+
+    def call_name(self, node: ast.Call) -> str:
+        """`name` for plain calls, `base.attr` for attribute calls (base empty if not a name)."""
+        key = id(node)
+        name = self._call_names.get(key)
+        if name is None:
+            func = node.func
+            if isinstance(func, ast.Name):
+                name = func.id
+            elif isinstance(func, ast.Attribute):
+                name = f"{getattr(func.value, 'id', '')}.{func.attr}"
+            else:
+                name = ""
+            self._call_names[key] = name
+        return name
+
+Check = Callable[[ast.AST, ScanContext], Iterable[SecurityFinding]]
+
+class Rule(NamedTuple):
+    rule_id: str
+    rule_set: str
+    node_types: Tuple[Type[ast.AST], ...]
+    check: Check
+
+RULES: Dict[str, Rule] = {}
+
+def rule(rule_id: str, rule_set: str, *node_types: Type[ast.AST]):
+    """Register a check for the given exact AST node types."""
+    def register(check: Check) -> Check:
+        RULES[rule_id] = Rule(rule_id, rule_set, node_types, check)
+        return check
+    return register
+
+class RuleEngine:
+    """Runs rules over a parsed module, handing each node only to the rules registered for its type.
+
+    ParsedModule already groups nodes by type in its single walk, so the cost
+    per node depends on the rules for that node's type, not on the total number of rules.
+    """
+
+    def __init__(self, rules: Iterable[Rule]):
+        self.dispatch: Dict[Type[ast.AST], List[Rule]] = {}
+        for r in rules:
+            for node_type in r.node_types:
+                self.dispatch.setdefault(node_type, []).append(r)
+
+    def run(self, module: ParsedModule) -> List[SecurityFinding]:
+        ctx = ScanContext(module)
+        findings: List[SecurityFinding] = []
+        for node_type, rules in self.dispatch.items():
+            for node in module.nodes(node_type):
+                for r in rules:
+                    findings.extend(r.check(node, ctx))
+        return findings
+
+@lru_cache(maxsize=1)
+def _load_config() -> dict:
+    if not SECURITY_RULES_CONFIG:
+        return {}
+    with open(SECURITY_RULES_CONFIG, encoding="utf-8") as fh:
+        return json.load(fh)
+
+def enabled_rule_sets(repo: Optional[str] = None) -> FrozenSet[str]:
+    """Rule sets in effect for a repo: every known set, minus global disables, with per-repo overrides."""
+    config = _load_config()
+    enabled = {r.rule_set for r in RULES.values()} | {"bandit"}
+    enabled -= set(config.get("disabled", []))
+    repo_config = config.get("repos", {}).get(repo or "", {})
+    enabled |= set(repo_config.get("enabled", []))
+    enabled -= set(repo_config.get("disabled", []))
+    return frozenset(enabled)
+
+@lru_cache(maxsize=64)
+def get_rule_engine(rule_sets: FrozenSet[str]) -> RuleEngine:
+    return RuleEngine(r for r in RULES.values() if r.rule_set in rule_sets)
+
+# --- Rules ---
+
+@rule("dynamic-exec", "injection", ast.Call)
+def _dynamic_exec(node: ast.Call, ctx: ScanContext) -> Iterator[SecurityFinding]:
+    if isinstance(node.func, ast.Name) and node.func.id in ('eval', 'exec'):
+        yield SecurityFinding(issue=f'Use of {node.func.id}()', severity='HIGH', line=node.lineno)
+
+@rule("shell-true", "injection", ast.Call)
+def _shell_true(node: ast.Call, ctx: ScanContext) -> Iterator[SecurityFinding]:
+    func_name = ctx.call_name(node)
+    if func_name not in SHELL_CALLS:
+        return
+    for kw in node.keywords:
+        if kw.arg == 'shell' and isinstance(kw.value, ast.Constant) and kw.value.value is True:
+            yield SecurityFinding(
+                issue=f'Use of {func_name} with shell=True - potential command injection',
+                severity='HIGH',
+                line=node.lineno
+            )
+
+@rule("hardcoded-secret", "secrets", ast.Assign)
+def _hardcoded_secret(node: ast.Assign, ctx: ScanContext) -> Iterator[SecurityFinding]:
+    if isinstance(node.value, ast.Constant):
+        val = str(node.value.value).lower()
+        if any(keyword in val for keyword in SENSITIVE_WORDS):
+            yield SecurityFinding(issue='Potential hardcoded secret', severity='MEDIUM', line=node.lineno)
+
+@rule("insecure-http", "network", ast.Call)
+def _insecure_http(node: ast.Call, ctx: ScanContext) -> Iterator[SecurityFinding]:
+    if not isinstance(node.func, ast.Attribute) or not ctx.call_name(node).startswith("requests."):
+        return
+    url_arg = node.args[0].value if node.args and isinstance(node.args[0], ast.Constant) else ''
+    if isinstance(url_arg, str) and url_arg.startswith('http://'):
+        yield SecurityFinding(issue='Insecure HTTP request (not HTTPS)', severity='MEDIUM', line=node.lineno)
+
+@rule("sensitive-data", "secrets", ast.Call)
+def _sensitive_data(node: ast.Call, ctx: ScanContext) -> Iterator[SecurityFinding]:
+    if not isinstance(node.func, ast.Attribute):
+        return
+    for kw in node.keywords:
+        if kw.arg == "data" and isinstance(kw.value, ast.Dict):
+            for val in kw.value.values:
+                if isinstance(val, ast.Constant) and any(
+                    s in str(val.value).lower() for s in ['password', 'secret', 'token', 'apikey']
+                ):
+                    yield SecurityFinding(
+                        issue='Potential sensitive data leakage via print/logging',
+                        severity='LOW',
+                        line=node.lineno
+                    )
@@ -0,0 +1,57 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+from analyzer import analyze_code
+from security import scan_code
+from parsed_module import ParsedModule
+from schemas import ArchitectureMetric, SecurityFinding
+from core.logging_config import logger
+
+# 0 runs static analysis on the calling thread instead of a process pool
+STATIC_ANALYSIS_WORKERS = int(os.getenv("STATIC_ANALYSIS_WORKERS", str(os.cpu_count() or 1)))
+
+def analyze_python(code: str, filename: Optional[str] = None,
+                   rule_sets: Optional[Iterable[str]] = None) -> Tuple[List[ArchitectureMetric], List[SecurityFinding]]:
+    """Architecture and security passes for one Python file.
+
+    Lives in a torch-free module so process-pool workers only import the analyzers.
+    `rule_sets` are resolved by the caller, since per-repo configuration lives in the parent process.
+    """
+    module = ParsedModule(code, filename)
+    arch = analyze_code(code, filename, module=module)
+    sec = scan_code(code, filename, module=module, rule_sets=rule_sets)
+    return arch, sec
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_analysis_pool() -> Optional[ProcessPoolExecutor]:
+    """Process pool for CPU-bound analysis, created on first use.
+
+    A pool whose worker died is broken for good (every submit raises
+    BrokenProcessPool), so it is replaced by a new one.
+    """
+    global _pool
+    if STATIC_ANALYSIS_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is not None and _pool._broken:
+            logger.warning(f"Static analysis pool is broken ({_pool._broken}), starting a new one")
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            # spawn: never fork a process that may hold CUDA state or model weights
+            _pool = ProcessPoolExecutor(
+                max_workers=STATIC_ANALYSIS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+def shutdown_analysis_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
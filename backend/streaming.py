@@ -0,0 +1,79 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+TERMINAL_EVENTS = ("job_completed", "job_failed")
+# ends this process's stream for a job that went back to the queue; it may be retried elsewhere
+CLOSING_EVENTS = TERMINAL_EVENTS + ("job_requeued",)
+# delivered to current subscribers only: a job's tokens would otherwise all stay in memory until it ends
+LIVE_ONLY_EVENTS = ("token",)
+
+class JobEventBroker:
+    """Fan-out of per-job progress and token events to SSE subscribers.
+
+    Events may be published from executor threads; they are handed to the event
+    loop with call_soon_threadsafe. Progress and final events of a running job
+    are kept so a client that subscribes late still sees them; token events are
+    not replayed.
+    """
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.history: Dict[str, List[dict]] = {}
+        self.subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    def open(self, job_id: str):
+        self.loop = asyncio.get_running_loop()
+        self.history[job_id] = []
+        self.subscribers[job_id] = []
+
+    def is_open(self, job_id: str) -> bool:
+        return job_id in self.history
+
+    def has_subscribers(self, job_id: str) -> bool:
+        return bool(self.subscribers.get(job_id))
+
+    def publish(self, job_id: str, event: str, data: Any = None):
+        if self.loop is None:
+            return
+        message = {"event": event, "data": data}
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._dispatch(job_id, message)
+        else:
+            self.loop.call_soon_threadsafe(self._dispatch, job_id, message)
+
+    def _dispatch(self, job_id: str, message: dict):
+        if job_id not in self.history:
+            return
+        if message["event"] not in LIVE_ONLY_EVENTS:
+            self.history[job_id].append(message)
+        for q in self.subscribers[job_id]:
+            q.put_nowait(message)
+        if message["event"] in CLOSING_EVENTS:
+            # subscribers already hold the closing event; late clients read the job state from the DB
+            del self.history[job_id]
+            del self.subscribers[job_id]
+
+    async def subscribe(self, job_id: str):
+        q: asyncio.Queue = asyncio.Queue()
+        for message in self.history.get(job_id, []):
+            q.put_nowait(message)
+        if job_id in self.subscribers:
+            self.subscribers[job_id].append(q)
+        try:
+            while True:
+                message = await q.get()
+                yield message
+                if message["event"] in CLOSING_EVENTS:
+                    return
+        finally:
+            subs = self.subscribers.get(job_id)
+            if subs and q in subs:
+                subs.remove(q)
+
+def format_sse(message: dict) -> str:
+    return f"event: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
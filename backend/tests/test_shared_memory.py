@@ -0,0 +1,80 @@
+"""LLM_WEIGHTS=mmap: weights stay in the checkpoint's file mapping and are shared between processes."""
+import os
+import multiprocessing as mp
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("safetensors")
+pytest.importorskip("accelerate")
+transformers = pytest.importorskip("transformers")
+
+pytestmark = pytest.mark.skipif(not os.path.exists("/proc/self/smaps"), reason="needs /proc/self/smaps (Linux)")
+
+def file_mappings(path):
+    """{(start, end): shared kB} of the calling process's mappings of `path`."""
+    mappings, current = {}, None
+    with open("/proc/self/smaps") as fh:
+        for line in fh:
+            parts = line.split()
+            if "-" in parts[0] and not parts[0].endswith(":"):
+                start, end = (int(x, 16) for x in parts[0].split("-"))
+                current = (start, end) if len(parts) >= 6 and parts[5] == path else None
+                if current:
+                    mappings[current] = 0
+            elif current and parts[0] in ("Shared_Clean:", "Shared_Dirty:"):
+                mappings[current] += int(parts[1])
+    return mappings
+
+def is_file_backed(tensor, mappings):
+    return any(start <= tensor.data_ptr() < end for start, end in mappings)
+
+def hold_weights(checkpoint, barrier, results):
+    from review_engines.mmap_weights import load_mmap_model
+
+    model = load_mmap_model(checkpoint, torch.float32)
+    path = os.path.realpath(os.path.join(checkpoint, "model.safetensors"))
+    with torch.no_grad():
+        checksum = sum(float(p.sum()) for p in model.parameters())  # fault every weight page in
+    barrier.wait()  # both processes hold their weights
+    mappings = file_mappings(path)
+    backed = all(is_file_backed(p, mappings) for p in model.parameters())
+    results.put((backed, sum(mappings.values()), checksum))
+    barrier.wait()  # keep the mapping alive until the other process has measured
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    config = transformers.GPT2Config(vocab_size=64, n_positions=32, n_embd=32, n_layer=2, n_head=2)
+    torch.manual_seed(0)
+    transformers.GPT2LMHeadModel(config).save_pretrained(str(tmp_path), safe_serialization=True)
+    return str(tmp_path)
+
+def test_map_safetensors_reads_the_checkpoint(checkpoint):
+    from safetensors.torch import load_file
+    from review_engines.mmap_weights import map_safetensors
+
+    path = os.path.realpath(os.path.join(checkpoint, "model.safetensors"))
+    expected = load_file(path)
+    mapped = map_safetensors(path)
+
+    assert mapped.keys() == expected.keys()
+    mappings = file_mappings(path)
+    for name, tensor in mapped.items():
+        assert torch.equal(tensor, expected[name])
+        if tensor.numel():
+            assert is_file_backed(tensor, mappings), name
+
+def test_mmap_weights_are_shared_between_processes(checkpoint):
+    ctx = mp.get_context("spawn")
+    barrier, results = ctx.Barrier(2), ctx.Queue()
+    workers = [ctx.Process(target=hold_weights, args=(checkpoint, barrier, results)) for _ in range(2)]
+    for w in workers:
+        w.start()
+    samples = [results.get(timeout=120) for _ in workers]
+    for w in workers:
+        w.join(timeout=30)
+
+    assert all(w.exitcode == 0 for w in workers)
+    for backed, shared_kb, _ in samples:
+        assert backed, "parameters are not backed by the checkpoint mapping"
+        assert shared_kb > 0, "checkpoint pages are not shared with the other process"
+    assert samples[0][2] == samples[1][2]
@@ -1,20 +1,63 @@
 import os
-import tempfile
 import zipfile
 import shutil
-from typing import List
+from typing import Dict, Iterator, List, Tuple
 from git import Repo
 
-def extract_zip(zip_path: str) -> str:
-    temp_dir = tempfile.mkdtemp()
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(temp_dir)
-    return temp_dir
+ZIP_MAX_MEMBERS = int(os.getenv("ZIP_MAX_MEMBERS", "10000"))
+ZIP_MAX_TOTAL_BYTES = int(os.getenv("ZIP_MAX_TOTAL_BYTES", str(200 * 1024 * 1024)))
+MAX_SOURCE_FILE_BYTES = int(os.getenv("MAX_SOURCE_FILE_BYTES", str(1024 * 1024)))
 
-def clone_git_repo(git_url: str, clone_to: str = None) -> str:
-    target_dir = clone_to or tempfile.mkdtemp()
-    Repo.clone_from(git_url, target_dir)
-    return target_dir
+class ArchiveLimitError(ValueError):
+    """Archive exceeds the configured member count or uncompressed size."""
+
+def iter_zip_sources(zip_path: str, extensions: List[str] = None,
+                     max_file_bytes: int = MAX_SOURCE_FILE_BYTES,
+                     max_total_bytes: int = ZIP_MAX_TOTAL_BYTES,
+                     max_members: int = ZIP_MAX_MEMBERS) -> Iterator[Tuple[str, bytes]]:
+    """Yield (member name, contents) for matching archive members without extracting.
+
+    Limits are checked against the central directory before the first member is
+    read, and again against the bytes actually decompressed, since declared
+    sizes can be forged. Members larger than `max_file_bytes` are skipped.
+    """
+    extensions = extensions or ["py"]
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        infos = zf.infolist()
+        if len(infos) > max_members:
+            raise ArchiveLimitError(f"Archive has {len(infos)} members (limit {max_members})")
+        declared = sum(info.file_size for info in infos)
+        if declared > max_total_bytes:
+            raise ArchiveLimitError(f"Archive expands to {declared} bytes (limit {max_total_bytes})")
+
+        total = 0
+        for info in infos:
+            if info.is_dir():
+                continue
+            ext = os.path.splitext(info.filename)[1].lstrip('.').lower()
+            if ext not in extensions or info.file_size > max_file_bytes:
+                continue
+            with zf.open(info) as member:
+                data = member.read(max_file_bytes + 1)
+            if len(data) > max_file_bytes:
+                continue
+            total += len(data)
+            if total > max_total_bytes:
+                raise ArchiveLimitError(f"Archive expands past {max_total_bytes} bytes")
+            yield info.filename, data
+
+def git_tree_blobs(repo_dir: str, extensions: List[str] = None) -> Tuple[str, Dict[str, str]]:
+    """Return the HEAD commit sha and {relative path: blob sha} for matching files."""
+    extensions = extensions or ["py"]
+    commit = Repo(repo_dir).head.commit
+    blobs = {}
+    for item in commit.tree.traverse():
+        if item.type != "blob":
+            continue
+        ext = os.path.splitext(item.path)[1].lstrip('.').lower()
+        if ext in extensions:
+            blobs[item.path] = item.hexsha
+    return commit.hexsha, blobs
 
 def enumerate_source_files(path: str, extensions: List[str] = None) -> List[str]:
     extensions = extensions or ["py"]
@@ -0,0 +1,150 @@
+"""Standalone review worker.
+
+Claims jobs from the durable queue in the `jobs` table and processes them. Run
+as many worker processes as the hardware allows on the API's host; the API then
+only needs JOB_EXECUTION=queue. Workers must share that host: the SQLite
+database runs in WAL mode, which does not work over network filesystems, and
+uploads are kept in the API's local UPLOAD_DIR.
+
+    python worker.py --concurrency 2
+"""
+import os
+import socket
+import sqlite3
+import asyncio
+import argparse
+from uuid import uuid4
+from concurrent.futures import BrokenExecutor
+from functools import partial
+from typing import Dict
+from job_queue import JobQueue, cleanup_job
+from model_registry import MODEL_WARMUP, get_model_registry
+from models.job_status import JobStatus
+from core.logging_config import logger
+from core.metrics import JobTimings, current_job_timings, record_stage, serve_metrics
+
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "0.5"))
+# port serving Prometheus metrics of a standalone worker; 0 disables
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+# infrastructure failures worth another attempt; anything else the job raises would fail the same way again
+RETRYABLE_ERRORS = (sqlite3.Error, OSError, BrokenExecutor, MemoryError)
+# OS errors that another attempt cannot fix, e.g. an upload that was removed
+PERMANENT_ERRORS = (FileNotFoundError, IsADirectoryError, NotADirectoryError, PermissionError)
+
+def is_retryable(error: BaseException) -> bool:
+    return isinstance(error, RETRYABLE_ERRORS) and not isinstance(error, PERMANENT_ERRORS)
+
+class JobWorker:
+    def __init__(self, queue: JobQueue, concurrency: int = WORKER_CONCURRENCY,
+                 poll_seconds: float = WORKER_POLL_SECONDS):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.active: Dict[str, asyncio.Task] = {}
+        self._stopping = False
+
+    async def run(self):
+        logger.info(f"Worker {self.worker_id} started (concurrency={self.concurrency})")
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            if len(self.active) >= self.concurrency:
+                await asyncio.sleep(self.poll_seconds)
+                continue
+            try:
+                claimed = await loop.run_in_executor(None, self.queue.claim, self.worker_id)
+            except Exception as e:
+                logger.exception(f"Failed to claim a job: {e}")
+                claimed = None
+            if not claimed:
+                await asyncio.sleep(self.poll_seconds)
+                continue
+            job_id, payload, attempt, waited = claimed
+            logger.info(f"Worker {self.worker_id} claimed job_id: '{job_id}' (attempt {attempt}, queued {waited:.1f}s)")
+            task = asyncio.create_task(self._execute(job_id, payload, waited))
+            self.active[job_id] = task
+            task.add_done_callback(lambda _, job_id=job_id: self.active.pop(job_id, None))
+
+    async def stop(self):
+        self._stopping = True
+        for task in list(self.active.values()):
+            task.cancel()
+        await asyncio.gather(*self.active.values(), return_exceptions=True)
+
+    async def _heartbeat(self, job_id: str, work: asyncio.Task):
+        loop = asyncio.get_running_loop()
+        while not work.done():
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            if not await loop.run_in_executor(None, self.queue.heartbeat, job_id, self.worker_id):
+                logger.warning(f"Lost lease on job_id: '{job_id}', abandoning it")
+                work.cancel()
+                return
+
+    async def _execute(self, job_id: str, payload: dict, waited: float = 0.0):
+        import pipeline
+        loop = asyncio.get_running_loop()
+        events = pipeline.events
+        if not events.is_open(job_id):
+            events.open(job_id)
+
+        # this task's context, inherited by the job's tasks and carried into executor threads
+        timings = JobTimings()
+        current_job_timings.set(timings)
+        record_stage("queue_wait", waited)
+
+        work = asyncio.create_task(pipeline.run_job(job_id, payload))
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, work))
+        status, error = None, None
+        try:
+            files, architecture = await work
+            await loop.run_in_executor(
+                None, self.queue.complete, job_id, self.worker_id, files, architecture, timings.snapshot()
+            )
+            status = JobStatus.COMPLETED
+        except asyncio.CancelledError:
+            status = None  # lease lost or shutting down; the job is picked up again after its lease expires
+        except Exception as e:
+            error = str(e)
+            logger.exception(f"Exception while processing job_id: '{job_id}'.\n {e}")
+            status = await loop.run_in_executor(None, partial(
+                self.queue.fail, job_id, self.worker_id, error,
+                retry=is_retryable(e), timings=timings.snapshot()
+            ))
+        finally:
+            heartbeat.cancel()
+            pipeline.jobs.pop(job_id, None)
+
+        logger.info(f"Updating job for job_id: '{job_id}' with final status={status}")
+        if status == JobStatus.COMPLETED:
+            events.publish(job_id, "job_completed", {"job_id": job_id, "status": status})
+        elif status == JobStatus.FAILED:
+            events.publish(job_id, "job_failed", {"job_id": job_id, "status": status, "error": error})
+        else:
+            events.publish(job_id, "job_requeued", {"job_id": job_id, "status": JobStatus.PENDING, "error": error})
+        if status in (JobStatus.COMPLETED, JobStatus.FAILED):
+            cleanup_job(payload)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="jobs processed at once")
+    parser.add_argument("--warmup", action="store_true", default=MODEL_WARMUP, help="load models before claiming jobs")
+    parser.add_argument("--metrics-port", type=int, default=WORKER_METRICS_PORT, help="serve /metrics on this port")
+    args = parser.parse_args()
+
+    # not at module level: spawned analysis workers re-import this module as __mp_main__,
+    # and must not load the engines, models and databases that pipeline sets up
+    import pipeline
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+    if args.warmup:
+        get_model_registry().warmup()
+
+    worker = JobWorker(JobQueue(pipeline.db), concurrency=args.concurrency)
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        logger.info(f"Worker {worker.worker_id} stopped")
+
+if __name__ == "__main__":
+    main()
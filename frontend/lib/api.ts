@@ -2,13 +2,32 @@ import axios from "axios";
 
 export const API_BASE = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 
-export type JobStatus = "pending" | "completed" | "failed";
+export type JobStatus = "pending" | "running" | "completed" | "failed";
+
+/** Architecture diagram as JSON (`review.architecture[i].graph`) */
+export interface ArchitectureGraph {
+  nodes: { id: string; type: string; label: string }[];
+  edges: { source: string; target: string; relation: string }[];
+}
+
+/** Repository-wide module import graph of a multi-file job */
+export interface RepoArchitecture {
+  module_count: number;
+  edge_count: number;
+  cycles: string[][];
+  fan_in: { module: string; path: string; count: number }[];
+  fan_out: { module: string; path: string; count: number }[];
+  external_imports: Record<string, number>;
+  graph?: ArchitectureGraph;
+  dot_diagram?: string;
+}
 
 export interface FinalReview {
   job_id: string;
   status: JobStatus;
   result?: any;
   error?: string;
+  architecture?: RepoArchitecture;
 }
 
 /** Submit raw code */
@@ -58,6 +77,31 @@ export const pollJobStatus = async (
   });
 };
 
+export interface StreamHandlers {
+  onFileStarted?: (data: { index: number; total: number | null; filename?: string }) => void;
+  onToken?: (data: { filename?: string; text: string }) => void;
+  onFileCompleted?: (data: { index: number; total: number | null; filename?: string; review?: any }) => void;
+  onDone?: (data: { job_id: string; status: JobStatus; error?: string }) => void;
+}
+
+/** Subscribe to /stream/{jobId} server-sent events. Returns a function that closes the stream. */
+export const streamJob = (jobId: string, handlers: StreamHandlers): (() => void) => {
+  const source = new EventSource(`${API_BASE}/stream/${jobId}`);
+  const on = (name: string, fn?: (data: any) => void) =>
+    source.addEventListener(name, (e) => fn && fn(JSON.parse((e as MessageEvent).data)));
+
+  on("file_started", handlers.onFileStarted);
+  on("token", handlers.onToken);
+  on("file_completed", handlers.onFileCompleted);
+  ["job_completed", "job_failed"].forEach((name) =>
+    source.addEventListener(name, (e) => {
+      source.close();
+      if (handlers.onDone) handlers.onDone(JSON.parse((e as MessageEvent).data));
+    })
+  );
+  return () => source.close();
+};
+
 /** Health check */
 if (typeof window !== "undefined") {
   const pingBackend = async () => {